@@ -1,19 +1,24 @@
 from flask import Flask, render_template, request, jsonify, Response
 from dotenv import load_dotenv
 import subprocess
+import argparse
 import json
+import queue
 import sys
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 
-from langchain_pinecone import PineconeVectorStore
-from langchain_openai import ChatOpenAI
-from langchain.chains import create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_core.prompts import ChatPromptTemplate
-from langchain.embeddings import HuggingFaceEmbeddings
-from pinecone import Pinecone, ServerlessSpec
+from bm25_index import BM25Index
+import context_packing
+from embedding_engine import get_embeddings
+from keyword_matcher import route_category
+from lazy_init import Component, warm_up
+from local_index import LOCAL_INDEX_DIR, LocalVectorIndex, vector_backend
+from ngram_store import NGRAM_DB_PATH, NgramStore
+import query_cache
+from retrieval import RETRIEVE_K, PineconeIndex, hybrid_search, keyword_search
 
 
 
@@ -23,15 +28,31 @@ load_dotenv()
 
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-os.environ["PINECONE_API_KEY"] = PINECONE_API_KEY
-os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
+os.environ["PINECONE_API_KEY"] = PINECONE_API_KEY or ""
+os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY or ""
 
 
-# Embeddings + Pinecone setup
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
-index_name = "reddit-insights"
+# Embeddings, vector store and chains are built on first use (or by the warm-up
+# started with the server), so the UI routes are up before they are loaded.
+# LangChain and Pinecone modules are imported there too, they take seconds.
+def load_embeddings():
+    # Settings from EMBED_* env vars (see embedding_engine.py); queries are embedded in-process
+    embeddings = get_embeddings(workers=1)
+    embeddings.embed_query("warm up")  # loads the model
+    return embeddings
 
-try:
+
+def load_docsearch():
+    if vector_backend() == "local":
+        docsearch = LocalVectorIndex(embedding_model.get())
+        if not len(docsearch):
+            raise FileNotFoundError(f"local vector index '{LOCAL_INDEX_DIR}' is empty")
+        print(f"Loaded local vector index: {LOCAL_INDEX_DIR} ({len(docsearch)} vectors)")
+        return docsearch
+
+    from pinecone import Pinecone, ServerlessSpec
+
+    index_name = "reddit-insights"
     pc = Pinecone(api_key=PINECONE_API_KEY)
     existing_indexes = [i["name"] for i in pc.list_indexes()]
     if index_name not in existing_indexes:
@@ -47,20 +68,7 @@ try:
     else:
         print(f"Connected to existing Pinecone index: {index_name}")
 
-    docsearch = PineconeVectorStore.from_existing_index(
-        index_name=index_name,
-        embedding=embeddings
-    )
-except Exception as e:
-    print(f" Could not connect to Pinecone: {e}")
-    docsearch = None
-
-retriever = None
-if docsearch:
-    retriever = docsearch.as_retriever(
-        search_type="similarity",
-        search_kwargs={"k": 10,}
-    )
+    return PineconeIndex(pc.Index(index_name))
 
 
 # System prompt
@@ -74,10 +82,41 @@ system_prompt = (
     "Context:\n{context}"
 )
 
-llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0.2, max_tokens=400)
-prompt = ChatPromptTemplate.from_messages([("system", system_prompt), ("human", "{input}")])
-question_answer_chain = create_stuff_documents_chain(llm, prompt)
-rag_chain = create_retrieval_chain(retriever, question_answer_chain) if retriever else None
+
+def make_llm():
+    if os.getenv("CHAT_LLM", "openai") == "fake":
+        from fake_llm import FakeStreamingChatModel
+        return FakeStreamingChatModel()  # offline runs and benchmarks, see fake_llm.py
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(model="gpt-3.5-turbo", temperature=0.2, max_tokens=400)
+
+
+def load_chain(llm=None):
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+    from langchain_core.prompts import ChatPromptTemplate
+
+    prompt = ChatPromptTemplate.from_messages([("system", system_prompt), ("human", "{input}")])
+    return create_stuff_documents_chain(llm or make_llm(), prompt)
+
+
+embedding_model = Component("embedding model", load_embeddings)
+# The local index is reloaded when store_index.py bumps index_version.txt
+vector_store = Component("vector index", load_docsearch,
+                         version=query_cache.read_index_version if vector_backend() == "local" else None)
+answer_chain = Component("LLM chain", load_chain)
+# Written by store_index.py on every run, and reloaded like the local vector index
+keyword_index = Component("BM25 keyword index", BM25Index, required=False, version=query_cache.read_index_version)
+COMPONENTS = [embedding_model, vector_store, answer_chain, keyword_index]
+
+# Answers of recent questions, dropped when store_index.py changes the index
+answer_cache = query_cache.from_env()
+# Retrieved chunks are packed into CONTEXT_TOKENS before they reach the LLM
+context_packer = context_packing.from_env()
+
+# Retrieval + LLM calls run on a bounded pool; identical questions in flight share one call
+CHAT_WORKERS = int(os.getenv("CHAT_WORKERS", 8))
+chat_pool = ThreadPoolExecutor(max_workers=CHAT_WORKERS, thread_name_prefix="chat")
+in_flight = query_cache.InFlight()
 
 
 
@@ -92,6 +131,15 @@ PIPELINE_STEPS = {
 
 
 
+# Scripts print structured records (e.g. scrape metrics) on lines with this prefix
+METRICS_PREFIX = "METRICS "
+
+
+def sse(data, event=None):
+    """One Server-Sent Events message (data must not contain newlines)."""
+    return f"event: {event}\ndata:{data}\n\n" if event else f"data:{data}\n\n"
+
+
 # Utility: Run scripts with live log streaming
 def stream_process(script_path):
     process = subprocess.Popen(
@@ -104,11 +152,15 @@ def stream_process(script_path):
         errors="replace"
     )
     for line in iter(process.stdout.readline, ''):
-        yield f"data:{line.strip()}\n\n"
+        line = line.strip()
+        if line.startswith(METRICS_PREFIX):
+            yield sse(line[len(METRICS_PREFIX):], "metrics")
+        else:
+            yield sse(line)
     process.stdout.close()
     process.wait()
-    yield f"data: Step finished.\n\n"
-    yield "event: close\ndata: done\n\n"
+    yield sse(" Step finished.")
+    yield sse(" done", "close")
 
 
 
@@ -166,45 +218,236 @@ def get_evaluation_results():
 
 
 
+@app.route("/painpoints")
+def painpoints():
+    """Top pain-point unigrams and bigrams from ngram_counts.db (kept current by data_sentiment.py)."""
+    if not os.path.exists(NGRAM_DB_PATH):
+        return jsonify({"error": "No n-gram counts found. Run sentiment analysis first."}), 404
+
+    k = request.args.get("k", default=20, type=int)
+    filters = {
+        "sentiment": request.args.get("sentiment", "negative"),
+        "category": request.args.get("category") or None,
+        "subreddit": request.args.get("subreddit") or None,
+    }
+    store = NgramStore()  # sqlite connections are per thread, so one per request
+    try:
+        result = {
+            name: [{"ngram": ngram, "count": count} for ngram, count in store.top(n=n, k=k, **filters)]
+            for name, n in [("unigrams", 1), ("bigrams", 2)]
+        }
+    finally:
+        store.close()
+    return jsonify({**filters, **result})
+
+
+
 # Chatbot endpoint
+NO_ANSWER = "I don’t know based on the provided Reddit data."
+
+
+def retrieve(msg, search_filter):
+    """(query vector, cached answer, [(doc, score)], chunk vectors); the question is embedded
+    once, unless its exact wording is cached or BM25 alone answers it (the query
+    vector is None then, and only exact wording hits the answer cache).
+    Chunks and their stored vectors come from retrieval.py (vector search fused
+    with BM25).
+    """
+    cached_answer = answer_cache.get_exact(msg, search_filter)
+    if cached_answer is not None:
+        return None, cached_answer, [], []
+    keyword_hits, keyword_only = keyword_search(msg, keyword_index.get(), RETRIEVE_K, search_filter)
+    if keyword_only:
+        return None, None, keyword_hits, None
+    query_vector = embedding_model.get().embed_query(msg)
+    cached_answer, _ = answer_cache.get(msg, search_filter, query_vector)
+    if cached_answer is not None:
+        return query_vector, cached_answer, [], []
+
+    hits, vectors = hybrid_search(query_vector, vector_store.get(), keyword_hits, RETRIEVE_K, search_filter)
+    return query_vector, None, hits, vectors
+
+
+def pack_context(query_vector, docs_with_scores, vectors):
+    """(documents for the prompt, packing stats); vectors are the chunks' stored vectors, or None
+    for keyword-only hits, which are packed in rank order."""
+    docs = [doc for doc, _ in docs_with_scores]
+    packed, stats = context_packer.pack(query_vector, docs, vectors)
+    print(f" Context: {stats['chunks_in']} chunks -> {stats['docs_out']} documents, "
+          f"{stats['tokens_in']} -> {stats['tokens_out']} tokens ({stats['tokens_saved']} saved)")
+    return packed, stats
+
+
 @app.route("/get", methods=["POST"])
 def chat():
     msg = request.form["msg"]
+    key = query_cache.question_key(msg, route_category(msg))
+    return in_flight.submit(key, chat_pool, answer_question, msg).result()
+
 
-    if not docsearch:
+def answer_question(msg):
+    if not vector_store.get():
         return " Pinecone index not found. Please run 'Store to Pinecone' step first."
 
-     # --- NEW: category-aware filtering ---
-    if "construction" in msg.lower():
-        search_filter = {"category": "Construction"}
-    elif "law" in msg.lower() or "legal" in msg.lower():
-        search_filter = {"category": "Law"}
-    elif "tech" in msg.lower() or "software" in msg.lower():
-        search_filter = {"category": "Tech"}
-    else:
-        search_filter = None
+    search_filter = route_category(msg)
 
     # --- Retrieval ---
     try:
-        retrieved_docs_with_scores = docsearch.similarity_search_with_score(
-            msg, k=10, filter=search_filter
-        )
-        relevant_docs = [doc for doc, score in retrieved_docs_with_scores if doc.page_content.strip()]
+        query_vector, cached_answer, docs_with_scores, vectors = retrieve(msg, search_filter)
     except Exception as e:
         return f"Error during retrieval: {e}"
+    if cached_answer is not None:
+        return cached_answer
 
+    relevant_docs, _ = pack_context(query_vector, docs_with_scores, vectors)
     if not relevant_docs:
-        return "I don’t know based on the provided Reddit data."
+        return NO_ANSWER
 
-    response = question_answer_chain.invoke({"input": msg, "context": relevant_docs})
+    response = answer_chain.get().invoke({"input": msg, "context": relevant_docs})
     final_answer = response.strip() if isinstance(response, str) else str(response)
 
     if not final_answer or "I don’t know" in final_answer:
-        return "I don’t know based on the provided Reddit data."
+        final_answer = NO_ANSWER
+    answer_cache.put(msg, search_filter, final_answer, query_vector)
     return final_answer
 
 
+def stream_answer(msg):
+    """SSE events: sources (retrieved chunks), token (JSON-encoded text pieces), done (timings)."""
+    started = time.perf_counter()
+    if not vector_store.get():
+        yield sse(json.dumps(" Pinecone index not found. Please run 'Store to Pinecone' step first."), "error")
+        return
+
+    search_filter = route_category(msg)
+    key = query_cache.question_key(msg, search_filter)
+    future, leader = in_flight.join(key)
+    if not leader:
+        # The same question is being answered for another request: send its answer when ready
+        try:
+            answer = future.result()
+        except Exception as e:
+            yield sse(json.dumps(f"Error: {e}"), "error")
+            return
+        elapsed = round((time.perf_counter() - started) * 1000, 1)
+        yield sse(json.dumps(answer), "token")
+        yield sse(json.dumps({"ttft_ms": elapsed, "total_ms": elapsed, "cached": False, "coalesced": True}), "done")
+        return
+
+    answer = None
+    try:
+        answer = yield from generate_answer(msg, search_filter, started)
+    finally:
+        error = None if answer is not None else RuntimeError("the answer was not finished")
+        in_flight.finish(key, future, answer, error)
+
+
+def generate_answer(msg, search_filter, started):
+    """Yield the SSE events of one answer and return its text."""
+    first_token = None
+    try:
+        query_vector, cached_answer, docs_with_scores, vectors = retrieve(msg, search_filter)
+    except Exception as e:
+        yield sse(json.dumps(f"Error during retrieval: {e}"), "error")
+        return f"Error during retrieval: {e}"
+
+    answer = cached_answer
+    packing = None
+    if answer is None:
+        yield sse(json.dumps([
+            {**doc.metadata, "score": round(float(score), 4)} for doc, score in docs_with_scores
+        ], default=str), "sources")
+        relevant_docs, packing = pack_context(query_vector, docs_with_scores, vectors)
+        pieces = []
+        if relevant_docs:
+            for piece in answer_chain.get().stream({"input": msg, "context": relevant_docs}):
+                if not piece:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter()
+                pieces.append(piece)
+                yield sse(json.dumps(piece), "token")
+        answer = "".join(pieces).strip()
+        if not answer or "I don’t know" in answer:
+            answer = NO_ANSWER
+            yield sse(json.dumps(answer), "replace")  # same fallback text as /get
+        answer_cache.put(msg, search_filter, answer, query_vector)
+    else:
+        yield sse(json.dumps(answer), "token")
+
+    finished = time.perf_counter()
+    ttft = (first_token or finished) - started
+    print(f" /get/stream: first token after {ttft * 1000:.0f} ms, answer after {(finished - started) * 1000:.0f} ms"
+          f"{' (cached)' if cached_answer is not None else ''}")
+    yield sse(json.dumps({"ttft_ms": round(ttft * 1000, 1), "total_ms": round((finished - started) * 1000, 1),
+                          "cached": cached_answer is not None,
+                          "tokens_saved": packing["tokens_saved"] if packing else 0}), "done")
+    return answer
+
+
+def on_chat_pool(events):
+    """Run an event generator on the chat pool and relay its events to the response."""
+    relay = queue.Queue()
+    done = object()
+
+    def run():
+        try:
+            for event in events:
+                relay.put(event)
+        except Exception as e:
+            relay.put(sse(json.dumps(f"Error: {e}"), "error"))
+        finally:
+            relay.put(done)
+
+    chat_pool.submit(run)
+    while (event := relay.get()) is not done:
+        yield event
+
+
+@app.route("/get/stream", methods=["POST"])
+def chat_stream():
+    """/get with the answer streamed as Server-Sent Events while the LLM writes it."""
+    msg = request.form["msg"]
+    return Response(on_chat_pool(stream_answer(msg)), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/ready")
+def ready():
+    """Which lazily loaded components are ready; 503 until all of them are."""
+    components = {component.name: component.status() for component in COMPONENTS}
+    all_loaded = all(status["loaded"] for status in components.values() if status["required"])
+    return jsonify({"ready": all_loaded, "components": components}), 200 if all_loaded else 503
+
+
+@app.route("/cache/stats")
+def cache_stats():
+    """Hit/miss counters of the /get answer cache."""
+    return jsonify({**answer_cache.stats(), **in_flight.stats()})
+
+
+@app.route("/context/stats")
+def context_stats():
+    """Prompt tokens before and after context packing, summed over requests."""
+    return jsonify(context_packer.stats())
+
+
 
 # Run Flask
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8080, debug=True)
+    parser = argparse.ArgumentParser(description="Reddit insights web app.")
+    parser.add_argument("--production", action="store_true",
+                        help="serve with waitress (multi-threaded, no debugger or reloader)")
+    parser.add_argument("--threads", type=int, default=int(os.getenv("APP_THREADS", 32)),
+                        help="waitress request threads (streams hold one each)")
+    parser.add_argument("--port", type=int, default=8080)
+    cli = parser.parse_args()
+    # The debug reloader runs this file twice; only its serving child warms up
+    if cli.production or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        warm_up(COMPONENTS)
+    if cli.production:
+        from waitress import serve
+        print(f" Serving on port {cli.port} with {cli.threads} threads, {CHAT_WORKERS} chat workers.")
+        serve(app, host="0.0.0.0", port=cli.port, threads=cli.threads)
+    else:
+        app.run(host="0.0.0.0", port=cli.port, debug=True)
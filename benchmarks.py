@@ -0,0 +1,916 @@
+"""Offline benchmarks for the pipeline scripts.
+
+Each subcommand runs against local fakes or synthetic data, so no Reddit,
+Pinecone or OpenAI credentials are needed:
+
+    python benchmarks.py collect --subreddits 31 --workers 8
+"""
+import argparse
+import random
+import time
+import threading
+from collections import deque
+from types import SimpleNamespace
+
+import sys
+sys.stdout.reconfigure(line_buffering=True)
+
+
+# --------- FAKE PRAW CLIENT ----------
+class FakeCommentForest:
+    """Comment forest that counts every comment node handed out."""
+
+    def __init__(self, comments, visits=None):
+        self._comments = comments
+        self.visits = visits if visits is not None else [0]
+
+    def replace_more(self, limit=0):
+        return []
+
+    def list(self):
+        # Same breadth-first flattening as praw's CommentForest.list()
+        flat, queue = [], deque(self._comments)
+        while queue:
+            comment = queue.popleft()
+            self.visits[0] += 1
+            flat.append(comment)
+            queue.extend(comment.replies._comments)
+        return flat
+
+    def __iter__(self):
+        for comment in self._comments:
+            self.visits[0] += 1
+            yield comment
+
+
+def make_comment_tree(width, depth, created_utc, visits, prefix="c"):
+    """Full comment tree with `width` replies per node, `depth` levels deep."""
+    comments = []
+    for i in range(width):
+        cid = f"{prefix}{i}"
+        replies = make_comment_tree(width, depth - 1, created_utc, visits, cid + "_") if depth > 1 else []
+        comments.append(SimpleNamespace(
+            id=cid, body=f"comment {cid} " * 20, author="someone", score=1,
+            created_utc=created_utc, edited=False, parent_id="t3_post",
+            replies=FakeCommentForest(replies, visits),
+        ))
+    return comments
+
+
+class FakeSubmission:
+    """Submission whose comments cost one simulated API round-trip."""
+
+    def __init__(self, client, post_id, created_utc, n_comments):
+        self._client = client
+        self._n_comments = n_comments
+        self._forest = None
+        self.id = post_id
+        self.title = f"title {post_id}"
+        self.selftext = f"body of {post_id}"
+        self.author = "someone"
+        self.score = 1
+        self.num_comments = n_comments
+        self.created_utc = created_utc
+        self.edited = False
+
+    @property
+    def comments(self):
+        if self._forest is None:
+            self._client.call()
+            self._forest = FakeCommentForest([
+                SimpleNamespace(
+                    id=f"{self.id}_c{i}", body=f"comment {i}", author="someone", score=1,
+                    created_utc=self.created_utc + i + 1, edited=False,
+                    parent_id=f"t3_{self.id}", replies=FakeCommentForest([]),
+                )
+                for i in range(self._n_comments)
+            ])
+        return self._forest
+
+
+class FakeSubreddit:
+    def __init__(self, client, name):
+        self._client = client
+        self._name = name
+
+    def new(self, limit=100):
+        self._client.call()
+        now = time.time()
+        for i in range(limit):
+            yield FakeSubmission(self._client, f"{self._name}_{i}", now - i * 60, self._client.comments_per_post)
+
+
+class FakeReddit:
+    """Stand-in for praw.Reddit that sleeps `latency` seconds per API call."""
+
+    def __init__(self, latency=0.05, comments_per_post=5):
+        self.latency = latency
+        self.comments_per_post = comments_per_post
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def call(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+
+    def subreddit(self, name):
+        return FakeSubreddit(self, name)
+
+
+# --------- SYNTHETIC CORPUS ----------
+FILLER = ("the our team we have been using for months and it keeps crashing when we try "
+          "to export reports support is slow but pricing is fine overall would recommend "
+          "anyone looking at options this year").split()
+
+
+def synthetic_corpus(rows, seed=0):
+    """DataFrame shaped like reddit_data.csv with keywords sprinkled into the text."""
+    import numpy as np
+    import pandas as pd
+    from keyword_matcher import keywords_dict
+
+    rng = np.random.default_rng(seed)
+    categories = list(keywords_dict)
+    keywords = {c: [kw for kws in keywords_dict[c].values() for kw in kws] for c in categories}
+    cats = rng.choice(categories, size=rows)
+    titles, contents = [], []
+    for i, cat in enumerate(cats):
+        words = list(rng.choice(FILLER, size=rng.integers(10, 60)))
+        if rng.random() < 0.3:
+            kw = keywords[cat][rng.integers(len(keywords[cat]))]
+            words.insert(rng.integers(len(words)), kw.upper() if rng.random() < 0.2 else kw)
+        if rng.random() < 0.1:
+            words.append("https://example.com/x?y=1")
+        contents.append(" ".join(words) + ("!" if i % 3 else " 42."))
+        titles.append(np.nan if rng.random() < 0.5 else "Question about " + " ".join(rng.choice(FILLER, size=4)))
+    return pd.DataFrame({
+        "id": [f"r{i}" for i in range(rows)],
+        "category": cats,
+        "subreddit": rng.choice(["sysadmin", "Law", "Construction", "msp", "Paralegal"], size=rows),
+        "title": titles,
+        "content": contents,
+        "created_utc": pd.Timestamp("2025-09-01") + pd.to_timedelta(rng.integers(0, 60 * 86400, size=rows), unit="s"),
+        "type": np.where(pd.isna(titles), "comment", "post"),
+    })
+
+
+# --------- BENCHMARKS ----------
+def bench_collect(args):
+    """Sequential vs concurrent subreddit collection against FakeReddit."""
+    import data_collection as dc
+
+    dc.POST_LIMIT = args.posts
+    jobs = [("Tech", f"sub{i}") for i in range(args.subreddits)]
+    fake = FakeReddit(latency=args.latency)
+
+    start = time.perf_counter()
+    rows = sum(len(r) for _, _, r, _ in dc.collect_sequentially(jobs, {}, client=fake, sleep_time=args.sleep))
+    sequential = time.perf_counter() - start
+    print(f"sequential: {rows} rows in {sequential:.2f}s ({fake.calls} API calls)")
+
+    fake = FakeReddit(latency=args.latency)
+    limiter = dc.TokenBucket(args.rpm / 60, dc.BURST)
+    start = time.perf_counter()
+    rows = sum(len(r) for _, _, r, _ in dc.collect_concurrently(
+        jobs, {}, client_factory=lambda: fake, workers=args.workers, limiter=limiter))
+    concurrent = time.perf_counter() - start
+    print(f"concurrent ({args.workers} workers, {args.rpm} req/min): {rows} rows in {concurrent:.2f}s "
+          f"({fake.calls} API calls)")
+    print(f"speedup: {sequential / concurrent:.1f}x")
+
+
+def bench_comments(args):
+    """Old flatten-then-slice comment collection vs bounded traversal on a fake tree."""
+    import tracemalloc
+    from datetime import datetime
+    import data_collection as dc
+
+    visits = [0]
+    forest = FakeCommentForest(make_comment_tree(args.width, args.depth, time.time(), visits), visits)
+    last_time = datetime(2000, 1, 1)
+
+    def old():
+        forest.replace_more(limit=0)
+        return [c for c in forest.list()[:dc.COMMENT_LIMIT]
+                if datetime.utcfromtimestamp(c.created_utc) > last_time]
+
+    runs = [("flatten + slice", old)] + [
+        (f"bounded ({policy})", lambda policy=policy: dc.collect_comments(forest, last_time, policy=policy))
+        for policy in ("bfs", "top_level")
+    ]
+    print(f"tree: {len(forest.list())} comments (width={args.width}, depth={args.depth})")
+    for name, fn in runs:
+        visits[0] = 0
+        tracemalloc.start()
+        start = time.perf_counter()
+        kept = fn()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name:>20}: kept {len(kept)}, visited {visits[0]} nodes, "
+              f"peak alloc {peak / 1024:.1f} KiB, {elapsed * 1000:.2f} ms")
+
+
+def bench_keywords(args):
+    """Per-keyword row-wise regex matching vs KeywordMatcher on a synthetic corpus."""
+    import re
+    from keyword_matcher import KeywordMatcher, keywords_dict
+
+    df = synthetic_corpus(args.rows)
+    df["full_text"] = df[["title", "content"]].astype(str).agg(" ".join, axis=1)
+    print(f"corpus: {len(df)} rows")
+
+    # Previous data_clean.py implementation
+    def find_keywords(text, keywords):
+        return [kw for kw in keywords if re.search(rf"\b{re.escape(kw)}\b", text.lower())]
+
+    start = time.perf_counter()
+    old = df[["category", "full_text"]].copy()
+    old["keywords_found"] = [[] for _ in range(len(old))]
+    for category, subcats in keywords_dict.items():
+        mask = old["category"] == category
+        for subcat, keywords in subcats.items():
+            old.loc[mask, "keywords_found"] = old.loc[mask].apply(
+                lambda row: list(set(row["keywords_found"]) | set(find_keywords(str(row["full_text"]), keywords))),
+                axis=1
+            )
+    old_time = time.perf_counter() - start
+    print(f"per-keyword apply: {old_time:.2f}s")
+
+    start = time.perf_counter()
+    new = KeywordMatcher(keywords_dict).match_series(df["full_text"], df["category"])
+    new_time = time.perf_counter() - start
+    print(f"KeywordMatcher:    {new_time:.2f}s ({len(df) / new_time:,.0f} rows/s)")
+
+    same = all(set(a) == set(b) for a, b in zip(old["keywords_found"], new))
+    print(f"speedup: {old_time / new_time:.1f}x, identical matches: {same}")
+
+
+def bench_clean(args):
+    """Row-wise full_text/clean_text/clean_nan_words vs the vectorized text_utils versions."""
+    from text_utils import build_full_text, clean_text, clean_text_series, strip_nan_words
+
+    df = synthetic_corpus(args.rows)
+    print(f"corpus: {len(df)} rows")
+
+    def clean_nan_words(text):
+        text = str(text).lower()
+        return text.replace("nan ", "").replace(" nan", "").strip()
+
+    start = time.perf_counter()
+    old_full = df[["title", "content"]].astype(str).agg(" ".join, axis=1)
+    old_clean = old_full.apply(clean_text)
+    old_final = old_clean.apply(clean_nan_words)
+    old_time = time.perf_counter() - start
+    print(f"row-wise:   {old_time:.2f}s ({len(df) / old_time:,.0f} rows/s)")
+
+    start = time.perf_counter()
+    new_full = build_full_text(df["title"], df["content"])
+    new_clean = clean_text_series(new_full)
+    new_final = strip_nan_words(new_clean)
+    new_time = time.perf_counter() - start
+    print(f"vectorized: {new_time:.2f}s ({len(df) / new_time:,.0f} rows/s)")
+
+    # Rows with a title must match exactly; rows without one must match the old
+    # output minus the leading "nan" token the old join produced.
+    has_title = df["title"].notna()
+    expected = old_clean.where(has_title, old_clean.str.replace(r"^nan ?", "", regex=True))
+    nan_tokens = int(new_clean.str.contains(r"\bnan\b").sum())
+    print(f"speedup: {old_time / new_time:.1f}x, clean_text identical: {expected.equals(new_clean)}, "
+          f"'nan' tokens left: {nan_tokens}")
+
+
+def bench_near_dup(args):
+    """MinHash LSH near-duplicate collapse: scaling and accuracy against exact Jaccard."""
+    import numpy as np
+    from near_dup import near_duplicate_mask
+
+    rng = np.random.default_rng(0)
+    vocab = [f"w{i}" for i in range(5000)]
+
+    def corpus(n):
+        texts = [" ".join(rng.choice(vocab, size=rng.integers(20, 80))) for _ in range(n)]
+        # ~10% near-copies: one or two words changed, like quoted replies and cross-posts
+        for i in rng.choice(n, size=n // 10, replace=False):
+            words = texts[rng.integers(n)].split()
+            for pos in rng.integers(len(words), size=rng.integers(1, 3)):
+                words[pos] = "edited"
+            texts[i] = " ".join(words)
+        return texts
+
+    def shingles(text):
+        w = text.split()
+        return {tuple(w[i:i + 3]) for i in range(max(len(w) - 2, 1))}
+
+    # Accuracy on a corpus small enough for all-pairs exact Jaccard
+    texts = corpus(args.exact_rows)
+    start = time.perf_counter()
+    sets = [shingles(t) for t in texts]
+    exact = np.zeros(len(texts), dtype=bool)
+    for i in range(len(texts)):
+        for j in range(i + 1, len(texts)):
+            if len(sets[i] & sets[j]) / len(sets[i] | sets[j]) >= args.threshold:
+                exact[i] = True
+    exact_time = time.perf_counter() - start
+    start = time.perf_counter()
+    lsh = near_duplicate_mask(texts, args.threshold)
+    lsh_time = time.perf_counter() - start
+    hits = int((lsh & exact).sum())
+    print(f"{len(texts)} texts: exact all-pairs {exact_time:.2f}s marks {int(exact.sum())}, "
+          f"LSH {lsh_time:.2f}s marks {int(lsh.sum())} "
+          f"(recall {hits / max(exact.sum(), 1):.2f}, precision {hits / max(lsh.sum(), 1):.2f})")
+
+    # Scaling
+    for n in args.sizes:
+        texts = corpus(n)
+        start = time.perf_counter()
+        collapsed = int(near_duplicate_mask(texts, args.threshold).sum())
+        elapsed = time.perf_counter() - start
+        print(f"{n:>8} texts: {elapsed:.2f}s, collapsed {collapsed} ({n / elapsed:,.0f} texts/s)")
+
+
+def bench_sentiment(args):
+    """Row-wise VADER through Series.apply vs sentiment_engine.score_texts at several worker counts."""
+    import os
+    import numpy as np
+    from nltk.sentiment import SentimentIntensityAnalyzer
+    from sentiment_engine import label_scores, score_texts
+    from text_utils import clean_text_series
+
+    texts = clean_text_series(synthetic_corpus(args.rows)["content"])
+    print(f"corpus: {len(texts)} rows, {os.cpu_count()} cores")
+
+    sia = SentimentIntensityAnalyzer()
+    def get_sentiment(text):
+        score = sia.polarity_scores(str(text))["compound"]
+        if score > 0.05:
+            return "positive"
+        elif score < -0.05:
+            return "negative"
+        else:
+            return "neutral"
+
+    start = time.perf_counter()
+    old = texts.apply(get_sentiment).to_numpy()
+    base = time.perf_counter() - start
+    print(f"Series.apply:  {base:.2f}s ({len(texts) / base:,.0f} rows/s)")
+
+    workers = sorted({1, 2, 4, os.cpu_count() or 1} | set(args.workers or []))
+    for n in workers:
+        start = time.perf_counter()
+        labels = label_scores(score_texts(texts, workers=n))
+        elapsed = time.perf_counter() - start
+        print(f"{n:>2} workers:    {elapsed:.2f}s ({len(texts) / elapsed:,.0f} rows/s, "
+              f"{base / elapsed:.1f}x), identical labels: {bool(np.array_equal(old, labels))}")
+
+
+def bench_ngrams(args):
+    """word_tokenize + Counter pain-point n-grams vs the sparse ngram_engine, on negative-like rows."""
+    from collections import Counter
+    from nltk import bigrams, word_tokenize
+    from nltk.corpus import stopwords
+    from ngram_engine import pain_point_table
+    from text_utils import clean_text_series
+
+    df = synthetic_corpus(args.rows)
+    df["clean_text"] = clean_text_series(df["content"])
+    df["keywords_found"] = [[kw] for kw in df["subreddit"].str.lower()]
+    stop_words = set(stopwords.words("english"))
+    print(f"corpus: {len(df)} rows")
+
+    start = time.perf_counter()
+    tokens = df["clean_text"].apply(
+        lambda text: [t for t in word_tokenize(str(text).lower()) if t.isalpha() and t not in stop_words]
+    )
+    old_unigrams = Counter(tok for toks in tokens for tok in toks).most_common(20)
+    old_bigrams = Counter(" ".join(bg) for toks in tokens for bg in bigrams(toks)).most_common(20)
+    old_time = time.perf_counter() - start
+    print(f"Counter (global top-20 only):  {old_time:.2f}s")
+
+    start = time.perf_counter()
+    table, unigrams, bigram_counts = pain_point_table(df, stop_words)
+    new_time = time.perf_counter() - start
+    print(f"sparse (global + {table.groupby(['group_by', 'group']).ngroups} groups): {new_time:.2f}s")
+
+    same = dict(old_unigrams) == dict(unigrams) and dict(old_bigrams) == dict(bigram_counts)
+    print(f"speedup: {old_time / new_time:.1f}x, identical global counts: {same}")
+
+
+def bench_embed(args):
+    """Embedding throughput (chunks/sec) per FastEmbeddings setting and int8 cosine drift.
+
+    Needs sentence-transformers and the model weights (downloaded on first use).
+    """
+    import numpy as np
+    from embedding_engine import FastEmbeddings, load_model
+
+    df = synthetic_corpus(args.chunks)
+    texts = [text[:300] for text in (df["title"].fillna("") + " " + df["content"]).str.strip()]
+    print(f"corpus: {len(texts)} chunks, mean {np.mean([len(t) for t in texts]):.0f} chars")
+
+    # What HuggingFaceEmbeddings did: one in-process encode, batch size 32
+    model = load_model(args.model)
+    start = time.perf_counter()
+    model.encode(texts, batch_size=32, convert_to_numpy=True, show_progress_bar=False)
+    base = time.perf_counter() - start
+    print(f"HuggingFaceEmbeddings defaults: {len(texts) / base:8.1f} chunks/s")
+
+    full = None
+    for quantize in (False, True):
+        for workers in args.workers:
+            engine = FastEmbeddings(args.model, batch_size=args.batch_size, workers=workers, quantize=quantize,
+                                    start_method="spawn")
+            # Load the model(s) outside the timing: every worker when parallel, else this process
+            if engine.parallel:
+                engine.start()
+            else:
+                engine.encode(texts[:8])
+            start = time.perf_counter()
+            vectors = engine.encode(texts)
+            elapsed = time.perf_counter() - start
+            engine.close()
+            print(f"{engine.model_id.split('/')[-1]:>22}, batch {args.batch_size}, {workers} workers: "
+                  f"{len(texts) / elapsed:8.1f} chunks/s ({base / elapsed:.1f}x)")
+        if not quantize:
+            full = vectors
+
+    cosine = (full * vectors).sum(axis=1) / (np.linalg.norm(full, axis=1) * np.linalg.norm(vectors, axis=1))
+    print(f"int8 vs float32 cosine: mean {cosine.mean():.4f}, min {cosine.min():.4f}")
+
+
+def bench_vector_index(args):
+    """Exact scan vs IVF search in local_index.py: p50 query latency and recall@k, with and without a filter."""
+    import tempfile
+    import numpy as np
+    from local_index import EXACT_SCAN_ROWS, LocalVectorIndex
+
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(args.clusters, args.dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, args.clusters, args.vectors)] + rng.normal(
+        scale=args.noise, size=(args.vectors, args.dim)).astype(np.float32)
+    categories = rng.choice(["Law", "Construction", "Tech"], size=args.vectors)
+    queries = centers[rng.integers(0, args.clusters, args.queries)] + rng.normal(
+        scale=args.noise, size=(args.queries, args.dim)).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        exact_scan_rows = EXACT_SCAN_ROWS if args.exact_scan_rows is None else args.exact_scan_rows
+        index = LocalVectorIndex(path=tmp + "/index", exact_scan_rows=exact_scan_rows)
+        start = time.perf_counter()
+        index.add_vectors(vectors, [""] * args.vectors, [{"category": c} for c in categories],
+                          [str(i) for i in range(args.vectors)])
+        index.persist()
+        print(f"index: {args.vectors} x {args.dim}, {len(index.centroids)} lists, "
+              f"built in {time.perf_counter() - start:.1f}s")
+
+        for search_filter in (None, {"category": "Law"}):
+            truth = [set(index.search_vector(q, args.k, search_filter, exact=True)[0]) for q in queries]
+            runs = [("exact", {"exact": True}), ("default", {})]
+            runs += [(f"nprobe {n}", {"nprobe": n}) for n in args.nprobe]
+            for name, options in runs:
+                latencies, recall = [], []
+                for q, expected in zip(queries, truth):
+                    start = time.perf_counter()
+                    rows, _ = index.search_vector(q, args.k, search_filter, **options)
+                    latencies.append(time.perf_counter() - start)
+                    recall.append(len(expected & set(rows)) / len(expected))
+                print(f"{'filtered' if search_filter else 'no filter':>9}, {name:>9}: "
+                      f"p50 {np.percentile(latencies, 50) * 1000:6.2f} ms, recall@{args.k} {np.mean(recall):.3f}")
+
+
+class HashEmbeddings:
+    """Deterministic 64-dim text vectors, so retrieval runs without the model."""
+
+    model_id = "hash"
+
+    def embed_documents(self, texts):
+        import hashlib
+        import numpy as np
+        return [np.frombuffer(hashlib.sha512(t.encode("utf-8")).digest(), dtype=np.uint8).astype(np.float32).tolist()
+                for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class WordHashEmbeddings:
+    """Bag-of-words vectors (hashed word counts): near-duplicate texts get near-identical vectors."""
+
+    model_id = "word-hash"
+    dim = 256
+
+    def embed_documents(self, texts):
+        import hashlib
+        import re
+        import numpy as np
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r"[a-z0-9]+", text.lower()):
+                vectors[row, int.from_bytes(hashlib.blake2b(word.encode(), digest_size=4).digest(), "little")
+                        % self.dim] += 1
+        return vectors.tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def offline_app(args):
+    """app.py with the fake streaming LLM and an in-memory local index over synthetic posts."""
+    import os
+    import tempfile
+    os.environ["CHAT_LLM"] = "fake"
+    os.environ["VECTOR_BACKEND"] = "local"
+    import app
+    from bm25_index import BM25Builder, BM25Index
+    from fake_llm import FakeStreamingChatModel
+    from local_index import LocalVectorIndex
+
+    df = synthetic_corpus(args.docs)
+    texts = (df["title"].fillna("") + " " + df["content"]).str.strip().str[:300].tolist()
+    tmp = tempfile.mkdtemp()
+    embeddings = HashEmbeddings()
+    app.embedding_model.set(embeddings)
+    app.vector_store.set(LocalVectorIndex.from_texts(texts, embeddings, [{"category": c} for c in df["category"]],
+                                                     path=os.path.join(tmp, "index")))
+    keyword_index = BM25Builder(os.path.join(tmp, "bm25"))
+    for i, (text, category) in enumerate(zip(texts, df["category"])):
+        keyword_index.add(str(i), text, {"category": category})
+    keyword_index.save()
+    app.keyword_index.set(BM25Index(os.path.join(tmp, "bm25")))
+    app.answer_chain.set(app.load_chain(FakeStreamingChatModel(first_token_delay=args.first_token_delay,
+                                                               token_delay=args.token_delay)))
+    app.answer_cache = app.query_cache.QueryCache(version_path=os.path.join(tmp, "version"))
+    return app
+
+
+def bench_chat_stream(args):
+    """Time to first token of /get/stream vs the full /get answer, with the fake streaming LLM.
+
+    Needs the app's dependencies (Flask, LangChain); retrieval uses an in-memory
+    local index over synthetic posts, the LLM is fake_llm.FakeStreamingChatModel.
+    """
+    import numpy as np
+    from fake_llm import ANSWER_WORDS
+
+    app = offline_app(args)
+    client = app.app.test_client()
+    print(f"fake LLM: {args.first_token_delay * 1000:.0f} ms to first token, "
+          f"{args.token_delay * 1000:.0f} ms per token, {ANSWER_WORDS} tokens")
+
+    blocking, first_tokens, streamed = [], [], []
+    for q in range(args.questions):
+        start = time.perf_counter()
+        client.post("/get", data={"msg": f"question {q} about law software"}).get_data()
+        blocking.append(time.perf_counter() - start)
+
+        start, first = time.perf_counter(), None
+        response = client.post("/get/stream", data={"msg": f"stream question {q} about law software"},
+                               buffered=False)
+        for chunk in response.response:
+            if first is None and b"event: token" in (chunk if isinstance(chunk, bytes) else chunk.encode()):
+                first = time.perf_counter() - start
+        streamed.append(time.perf_counter() - start)
+        first_tokens.append(first)
+
+    print(f"/get:        first text after {np.median(blocking) * 1000:7.1f} ms (p50, whole answer)")
+    print(f"/get/stream: first token after {np.median(first_tokens) * 1000:7.1f} ms (p50), "
+          f"whole answer after {np.median(streamed) * 1000:.1f} ms")
+
+
+def bench_hybrid(args):
+    """Tool-name questions: precision@k and latency of dense, BM25 and fused retrieval.
+
+    A hit is a chunk that mentions the tool asked about. Dense retrieval uses
+    HashEmbeddings (no semantics, a lower bound) unless --model is given.
+    """
+    import os
+    import re
+    import tempfile
+    import numpy as np
+    from bm25_index import BM25Builder, BM25Index, reciprocal_rank_fusion
+    from keyword_matcher import keywords_dict, route_category
+    from local_index import LocalVectorIndex
+
+    df = synthetic_corpus(args.docs)
+    texts = (df["title"].fillna("") + " " + df["content"]).str.strip().str[:300].tolist()
+    metadatas = [{"category": c} for c in df["category"]]
+    if args.model:
+        from embedding_engine import get_embeddings
+        embeddings = get_embeddings(args.model)
+    else:
+        embeddings = HashEmbeddings()
+    tools = sorted({kw for subcats in keywords_dict.values() for kws in subcats.values() for kw in kws})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dense = LocalVectorIndex.from_texts(texts, embeddings, metadatas, path=os.path.join(tmp, "index"))
+        builder = BM25Builder(os.path.join(tmp, "bm25"))
+        for i, (text, metadata) in enumerate(zip(texts, metadatas)):
+            builder.add(str(i), text, metadata)
+        builder.save()
+        keywords = BM25Index(os.path.join(tmp, "bm25"))
+        print(f"corpus: {len(texts)} chunks, {len(tools)} tool questions, "
+              f"dense embeddings: {args.model or 'hash (no semantics)'}")
+
+        results = {"dense": ([], []), "bm25": ([], []), "fused": ([], [])}
+        for tool in tools:
+            question = f"What do people dislike about {tool}?"
+            search_filter = route_category(question)
+            mentions = re.compile(rf"\b{re.escape(tool)}\b", re.IGNORECASE)
+
+            start = time.perf_counter()
+            vector = embeddings.embed_query(question)
+            dense_hits = dense.similarity_search_by_vector_with_score(vector, k=args.k, filter=search_filter)
+            dense_time = time.perf_counter() - start
+            start = time.perf_counter()
+            keyword_hits = keywords.search(question, k=args.k, filter=search_filter)
+            keyword_time = time.perf_counter() - start
+            start = time.perf_counter()
+            fused_hits = reciprocal_rank_fusion([dense_hits, keyword_hits], k=args.k)
+            fused_time = dense_time + keyword_time + time.perf_counter() - start
+
+            for name, hits, elapsed in (("dense", dense_hits, dense_time), ("bm25", keyword_hits, keyword_time),
+                                        ("fused", fused_hits, fused_time)):
+                results[name][0].append(sum(bool(mentions.search(doc.page_content)) for doc, _ in hits) / args.k)
+                results[name][1].append(elapsed)
+
+        for name, (precision, latencies) in results.items():
+            print(f"{name:>6}: precision@{args.k} {np.mean(precision):.3f}, "
+                  f"p50 {np.percentile(latencies, 50) * 1000:6.2f} ms")
+
+
+def bench_context_pack(args):
+    """Prompt tokens of the top-k chunks before and after context_packing, per token budget.
+
+    Posts are split like store_index.py does (300 characters, 80 overlap) and a
+    share of them are reposted with one word changed; vectors are hashed word
+    counts (WordHashEmbeddings), so near-duplicates are close as with the real model.
+    """
+    import numpy as np
+    from langchain_core.documents import Document
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from context_packing import TOKEN_COUNTER, ContextPacker
+    from keyword_matcher import keywords_dict
+
+    df = synthetic_corpus(args.posts * 4)
+    rng = np.random.default_rng(0)
+    posts = [" ".join(df["content"].iloc[i:i + 4]) for i in range(0, len(df), 4)]
+    for i in rng.choice(len(posts), size=int(len(posts) * args.reposts), replace=False):
+        words = posts[rng.integers(len(posts))].split()
+        words[rng.integers(len(words))] = "honestly"
+        posts[i] = " ".join(words)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=80)
+    docs = [Document(page_content=piece, metadata={"id": f"p{i}", "chunk": position})
+            for i, post in enumerate(posts) for position, piece in enumerate(splitter.split_text(post))]
+    embeddings = WordHashEmbeddings()
+    vectors = np.array(embeddings.embed_documents([doc.page_content for doc in docs]), dtype=np.float32)
+    unit = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    tools = sorted({kw for subcats in keywords_dict.values() for kws in subcats.values() for kw in kws})
+    print(f"corpus: {len(posts)} posts, {len(docs)} chunks, {args.reposts:.0%} reposted; "
+          f"{len(tools)} questions, top {args.k} chunks each, tokens counted by {TOKEN_COUNTER}")
+
+    retrieved = []
+    for tool in tools:
+        query = np.array(embeddings.embed_query(f"what do people dislike about {tool} {tool}"), dtype=np.float32)
+        rows = np.argsort(-(unit @ (query / max(float(np.linalg.norm(query)), 1e-12))), kind="stable")[:args.k]
+        retrieved.append((query, [docs[r] for r in rows], vectors[rows]))
+
+    for budget in args.budget:
+        packer = ContextPacker(budget=budget)
+        latencies, results = [], []
+        for query, hits, hit_vectors in retrieved:
+            start = time.perf_counter()
+            packed, stats = packer.pack(query, hits, hit_vectors)
+            latencies.append(time.perf_counter() - start)
+            results.append(stats)
+        tokens_in = np.mean([r["tokens_in"] for r in results])
+        tokens_out = np.mean([r["tokens_out"] for r in results])
+        print(f"budget {budget or 'none':>4}: {tokens_in:6.1f} -> {tokens_out:6.1f} tokens "
+              f"({1 - tokens_out / tokens_in:5.1%} saved), {np.mean([r['docs_out'] for r in results]):4.1f} docs, "
+              f"{np.mean([r['redundant'] for r in results]):3.1f} near-duplicates dropped, "
+              f"pack p50 {np.percentile(latencies, 50) * 1000:5.2f} ms")
+
+
+def bench_load(args):
+    """Load test of POST /get: throughput and p50/p99 latency with concurrent clients.
+
+    Without --url the app runs in-process with the fake LLM (see offline_app),
+    once like the old dev setup (app.run's threaded werkzeug server, every /get
+    answered on its request thread, no coalescing) and once on waitress (threaded
+    werkzeug if waitress is missing) with the chat pool and coalescing.
+    """
+    import json
+    import urllib.parse
+    import urllib.request
+    from concurrent.futures import Future, ThreadPoolExecutor
+    import numpy as np
+
+    questions = [f"what do people dislike about tool {i} in law?" for i in range(args.distinct)]
+    rng = random.Random(0)
+    workload = [rng.choice(questions) for _ in range(args.requests)]
+
+    def run(url, label):
+        def ask(question):
+            start = time.perf_counter()
+            body = urllib.parse.urlencode({"msg": question}).encode()
+            with urllib.request.urlopen(url + "/get", data=body, timeout=600) as response:
+                response.read()
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as clients:
+            latencies = np.array(list(clients.map(ask, workload)))
+        elapsed = time.perf_counter() - start
+        with urllib.request.urlopen(url + "/cache/stats") as response:
+            stats = json.load(response)
+        print(f"{label:>11}: {len(workload) / elapsed:6.1f} req/s, p50 {np.percentile(latencies, 50) * 1000:7.1f} ms, "
+              f"p99 {np.percentile(latencies, 99) * 1000:7.1f} ms, LLM calls {stats.get('leaders', '?')}, "
+              f"coalesced {stats.get('coalesced', '?')}, cache hits {stats.get('exact_hits', 0) + stats.get('semantic_hits', 0)}")
+
+    print(f"{args.requests} requests, {args.clients} concurrent clients, {args.distinct} distinct questions")
+    if args.url:
+        run(args.url.rstrip("/"), "server")
+        return
+
+    import logging
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # no access log lines
+    app = offline_app(args)
+
+    class RequestThread:
+        """Runs the answer on the calling request thread, as /get did before the chat pool."""
+
+        def submit(self, fn, *args):
+            fn(*args)
+
+    class NoCoalescing(app.query_cache.InFlight):
+        def join(self, key):
+            with self.lock:
+                self.leaders += 1
+            return Future(), True
+
+    chat_pool = app.chat_pool
+    servers = [("dev", RequestThread(), NoCoalescing, lambda: make_server("127.0.0.1", 0, app.app, threaded=True))]
+    try:
+        from waitress.server import create_server
+        servers.append(("production", chat_pool, app.query_cache.InFlight,
+                        lambda: create_server(app.app, host="127.0.0.1", port=0, threads=args.clients)))
+    except ImportError:
+        servers.append(("production", chat_pool, app.query_cache.InFlight,
+                        lambda: make_server("127.0.0.1", 0, app.app, threaded=True)))
+
+    for label, pool, in_flight, make in servers:
+        # Fresh cache and counters for each server
+        app.answer_cache = app.query_cache.QueryCache(max_entries=0, version_path=app.answer_cache.version_path)
+        app.chat_pool = pool
+        app.in_flight = in_flight()
+        server = make()
+        port = server.socket.getsockname()[1] if hasattr(server, "socket") else server.effective_port
+        serving = threading.Thread(target=server.serve_forever if hasattr(server, "serve_forever") else server.run,
+                                   daemon=True)
+        serving.start()
+        run(f"http://127.0.0.1:{port}", label)
+        if hasattr(server, "shutdown"):
+            server.shutdown()
+        else:
+            server.close()
+
+
+def bench_cold_start(args):
+    """Seconds until app.py serves its UI, and until the model, index and chains are loaded.
+
+    Each run is a fresh interpreter. "ui" is import + first GET /; "all
+    components" adds the warm-up, i.e. what importing app.py cost when
+    everything was built at import time. Needs the app's dependencies and an index.
+    """
+    import json
+    import os
+    import subprocess
+    import sys
+    import numpy as np
+
+    code = (
+        "import json, time\n"
+        "start = time.perf_counter()\n"
+        "import app\n"
+        "imported = time.perf_counter() - start\n"
+        "app.app.test_client().get('/')\n"
+        "ui = time.perf_counter() - start\n"
+        "app.warm_up(app.COMPONENTS).join()\n"
+        "ready = app.app.test_client().get('/ready')\n"
+        "print(json.dumps({'import': imported, 'ui': ui, 'all': time.perf_counter() - start,\n"
+        "                  'ready': ready.status_code == 200}))\n"
+    )
+    runs = []
+    for _ in range(args.runs):
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=dict(os.environ))
+        lines = [line for line in result.stdout.splitlines() if line.startswith("{")]
+        if result.returncode or not lines:
+            print(result.stdout[-2000:], result.stderr[-2000:])
+            return
+        runs.append(json.loads(lines[-1]))
+    for key, label in [("import", "import app"), ("ui", "UI served"), ("all", "all components")]:
+        print(f"{label:>15}: {np.median([run[key] for run in runs]):6.2f}s (median of {len(runs)})")
+    print(f"/ready after warm-up: {'200' if all(run['ready'] for run in runs) else '503'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmarks.")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("collect", help="sequential vs concurrent Reddit collection")
+    p.add_argument("--subreddits", type=int, default=31)
+    p.add_argument("--posts", type=int, default=10)
+    p.add_argument("--workers", type=int, default=8)
+    p.add_argument("--latency", type=float, default=0.05, help="seconds per fake API call")
+    p.add_argument("--sleep", type=float, default=0.5, help="fixed sleep between subreddits in sequential mode")
+    p.add_argument("--rpm", type=float, default=6000, help="rate limit for the concurrent run")
+    p.set_defaults(func=bench_collect)
+
+    p = sub.add_parser("comments", help="comment traversal cost on a fake comment tree")
+    p.add_argument("--width", type=int, default=8)
+    p.add_argument("--depth", type=int, default=5)
+    p.set_defaults(func=bench_comments)
+
+    p = sub.add_parser("keywords", help="keyword matching in data_clean.py")
+    p.add_argument("--rows", type=int, default=1_000_000)
+    p.set_defaults(func=bench_keywords)
+
+    p = sub.add_parser("clean", help="text normalization in data_clean.py / data_sentiment.py")
+    p.add_argument("--rows", type=int, default=1_000_000)
+    p.set_defaults(func=bench_clean)
+
+    p = sub.add_parser("near-dup", help="MinHash LSH near-duplicate detection in data_clean.py")
+    p.add_argument("--threshold", type=float, default=0.8)
+    p.add_argument("--exact-rows", type=int, default=1500)
+    p.add_argument("--sizes", type=int, nargs="+", default=[25_000, 50_000, 100_000, 200_000])
+    p.set_defaults(func=bench_near_dup)
+
+    p = sub.add_parser("sentiment", help="VADER scoring in data_sentiment.py across worker counts")
+    p.add_argument("--rows", type=int, default=200_000)
+    p.add_argument("--workers", type=int, nargs="*", help="extra worker counts besides 1, 2, 4 and all cores")
+    p.set_defaults(func=bench_sentiment)
+
+    p = sub.add_parser("ngrams", help="pain-point n-gram counting in data_sentiment.py")
+    p.add_argument("--rows", type=int, default=200_000)
+    p.set_defaults(func=bench_ngrams)
+
+    p = sub.add_parser("embed", help="chunk embedding throughput in store_index.py (needs the model)")
+    p.add_argument("--chunks", type=int, default=2000)
+    p.add_argument("--model", default="sentence-transformers/all-mpnet-base-v2")
+    p.add_argument("--batch-size", type=int, default=64)
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    p.set_defaults(func=bench_embed)
+
+    p = sub.add_parser("vector-index", help="local IVF vector index latency and recall (VECTOR_BACKEND=local)")
+    p.add_argument("--vectors", type=int, default=200_000)
+    p.add_argument("--dim", type=int, default=768)
+    p.add_argument("--clusters", type=int, default=200, help="clusters in the synthetic vectors")
+    p.add_argument("--noise", type=float, default=2.0, help="spread of the vectors around their cluster")
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--k", type=int, default=10)
+    p.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32])
+    p.add_argument("--exact-scan-rows", type=int, default=None,
+                   help="exact search up to this many vectors (default: local_index.EXACT_SCAN_ROWS)")
+    p.set_defaults(func=bench_vector_index)
+
+    p = sub.add_parser("chat-stream", help="time to first token of the streaming chat endpoint (fake LLM)")
+    p.add_argument("--docs", type=int, default=2000)
+    p.add_argument("--questions", type=int, default=5)
+    p.add_argument("--first-token-delay", type=float, default=0.5, help="seconds before the fake LLM's first token")
+    p.add_argument("--token-delay", type=float, default=0.02, help="seconds between fake LLM tokens")
+    p.set_defaults(func=bench_chat_stream)
+
+    p = sub.add_parser("hybrid", help="dense vs BM25 vs fused retrieval for tool-name questions")
+    p.add_argument("--docs", type=int, default=20000)
+    p.add_argument("--k", type=int, default=10)
+    p.add_argument("--model", help="sentence-transformers model for the dense side (default: hash embeddings)")
+    p.set_defaults(func=bench_hybrid)
+
+    p = sub.add_parser("context-pack", help="prompt tokens saved by context_packing.py per token budget")
+    p.add_argument("--posts", type=int, default=5000)
+    p.add_argument("--reposts", type=float, default=0.2, help="share of posts that repeat another post")
+    p.add_argument("--k", type=int, default=10)
+    p.add_argument("--budget", type=int, nargs="+", default=[0, 300, 200], help="token budgets (0 = none)")
+    p.set_defaults(func=bench_context_pack)
+
+    p = sub.add_parser("load", help="concurrent /get load test: throughput and p50/p99 latency")
+    p.add_argument("--url", help="running app to test (default: in-process app with the fake LLM)")
+    p.add_argument("--requests", type=int, default=200)
+    p.add_argument("--clients", type=int, default=16)
+    p.add_argument("--distinct", type=int, default=20, help="distinct questions in the workload")
+    p.add_argument("--docs", type=int, default=2000)
+    p.add_argument("--first-token-delay", type=float, default=0.5)
+    p.add_argument("--token-delay", type=float, default=0.01)
+    p.set_defaults(func=bench_load)
+
+    p = sub.add_parser("cold-start", help="app.py startup time: UI served vs all components loaded")
+    p.add_argument("--runs", type=int, default=3)
+    p.set_defaults(func=bench_cold_start)
+
+    args = parser.parse_args()
+    random.seed(0)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
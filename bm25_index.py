@@ -0,0 +1,164 @@
+"""Local BM25 keyword index over the indexed chunks, and rank fusion with dense results.
+
+store_index.py writes it next to the vector index on every run. Tool names
+(procore, clio, westlaw, ...) are rare terms with a high IDF, so chunks that
+mention them rank first, which dense retrieval does not guarantee. app.py fuses
+both result lists with reciprocal rank fusion. On disk (bm25_index/<version>/,
+versioned like the local vector index, see local_index.publish_version):
+
+    postings.npz  (chunks x terms) term-frequency matrix, document lengths
+    terms.json    term of every column
+    docs.jsonl    id, text and metadata of every row
+"""
+import json
+import os
+import re
+
+import numpy as np
+from langchain_core.documents import Document
+from scipy import sparse
+
+from local_index import condition_mask, current_version_dir, new_version_dir, publish_version
+
+BM25_INDEX_DIR = "bm25_index"
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+K1 = 1.2
+B = 0.75
+RRF_K = 60              # rank offset of reciprocal rank fusion
+SPILL_CHUNKS = 10_000   # chunks whose postings are buffered before they are appended to disk
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+class BM25Builder:
+    """Collects chunks one at a time and saves the index.
+
+    Docs and postings are appended to files in a new version directory as they
+    come, so memory holds the vocabulary and at most SPILL_CHUNKS chunks of
+    postings. save() publishes the version.
+    """
+
+    def __init__(self, path=BM25_INDEX_DIR):
+        self.path = path
+        self.tmp = new_version_dir(path)
+        self._docs = open(os.path.join(self.tmp, "docs.jsonl"), "w", encoding="utf-8")
+        self._spill_files = {name: open(self._spill_path(name), "wb") for name in ("rows", "columns", "counts")}
+        self.terms = {}
+        self._rows, self._columns, self._counts = [], [], []
+        self.n_docs = 0
+
+    def _spill_path(self, name):
+        return os.path.join(self.tmp, f"{name}.i32")
+
+    def add(self, doc_id, text, metadata):
+        columns, counts = np.unique(
+            np.array([self.terms.setdefault(t, len(self.terms)) for t in tokenize(text)], dtype=np.int64),
+            return_counts=True,
+        )
+        self._rows.append(np.full(len(columns), self.n_docs, dtype=np.int64))
+        self._columns.append(columns)
+        self._counts.append(counts)
+        self._docs.write(json.dumps({"id": doc_id, "text": text, "metadata": metadata}, default=str) + "\n")
+        self.n_docs += 1
+        if len(self._rows) >= SPILL_CHUNKS:
+            self._spill()
+
+    def _spill(self):
+        for name, parts in (("rows", self._rows), ("columns", self._columns), ("counts", self._counts)):
+            if parts:
+                np.concatenate(parts).astype(np.int32).tofile(self._spill_files[name])
+            parts.clear()
+
+    def save(self):
+        self._spill()
+        self._docs.close()
+        spilled = {}
+        for name, f in self._spill_files.items():
+            f.close()
+            spilled[name] = np.fromfile(self._spill_path(name), dtype=np.int32)
+            os.remove(self._spill_path(name))
+        rows, columns, counts = spilled["rows"], spilled["columns"], spilled["counts"]
+        tf = sparse.csc_matrix((counts.astype(np.float32), (rows, columns)), shape=(self.n_docs, len(self.terms)))
+        np.savez(os.path.join(self.tmp, "postings.npz"), data=tf.data, indices=tf.indices, indptr=tf.indptr,
+                 shape=np.array(tf.shape), lengths=np.bincount(rows, weights=counts, minlength=self.n_docs))
+        with open(os.path.join(self.tmp, "terms.json"), "w", encoding="utf-8") as f:
+            json.dump(list(self.terms), f)
+        publish_version(self.path, self.tmp)
+
+
+class BM25Index:
+    """Okapi BM25 search with the same metadata filters as the vector indexes."""
+
+    def __init__(self, path=BM25_INDEX_DIR, k1=K1, b=B):
+        version = current_version_dir(path)
+        if not os.path.exists(os.path.join(version, "postings.npz")):
+            raise FileNotFoundError(f"no keyword index in '{path}', run store_index.py")
+        with np.load(os.path.join(version, "postings.npz")) as postings:
+            self.tf = sparse.csc_matrix((postings["data"], postings["indices"], postings["indptr"]),
+                                        shape=tuple(postings["shape"]))
+            lengths = postings["lengths"]
+        with open(os.path.join(version, "terms.json"), "r", encoding="utf-8") as f:
+            self.terms = {term: column for column, term in enumerate(json.load(f))}
+        self.ids, self.texts, self.metadatas = [], [], []
+        with open(os.path.join(version, "docs.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                doc = json.loads(line)
+                self.ids.append(doc["id"])
+                self.texts.append(doc["text"])
+                self.metadatas.append(doc["metadata"])
+        self._columns = {}
+
+        n_docs = len(self.ids)
+        document_frequency = np.diff(self.tf.indptr)
+        self.idf = np.log(1 + (n_docs - document_frequency + 0.5) / (document_frequency + 0.5))
+        # Per-document part of the BM25 denominator
+        self.norm = k1 * (1 - b + b * lengths / max(lengths.mean(), 1e-9)) if n_docs else np.empty(0)
+        self.k1 = k1
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _column(self, key):
+        if key not in self._columns:
+            self._columns[key] = np.array([m.get(key) for m in self.metadatas], dtype=object)
+        return self._columns[key]
+
+    def search(self, query, k=10, filter=None):
+        """[(Document, score)] of the k best chunks containing a query term."""
+        columns = {self.terms[t] for t in tokenize(query) if t in self.terms}
+        scores = np.zeros(len(self.ids))
+        for column in columns:
+            start, end = self.tf.indptr[column], self.tf.indptr[column + 1]
+            rows, tf = self.tf.indices[start:end], self.tf.data[start:end]
+            scores[rows] += self.idf[column] * tf * (self.k1 + 1) / (tf + self.norm[rows])
+        rows = np.flatnonzero(scores)
+        if filter:
+            keep = np.ones(len(rows), dtype=bool)
+            for key, condition in filter.items():
+                keep &= condition_mask(self._column(key)[rows], condition)
+            rows = rows[keep]
+        values = scores[rows]
+        order = np.argsort(-values, kind="stable")[:k]
+        return [
+            (Document(page_content=self.texts[r], metadata=self.metadatas[r], id=self.ids[r]), float(values[i]))
+            for i, r in zip(order, rows[order])
+        ]
+
+
+def doc_key(doc):
+    # Dense hits may come back without ids; chunk metadata identifies them too
+    return doc.metadata.get("id"), doc.metadata.get("chunk"), doc.page_content
+
+
+def reciprocal_rank_fusion(result_lists, k=10, rrf_k=RRF_K):
+    """Fuse ranked [(Document, score)] lists into the top k [(Document, fused score)]."""
+    fused, docs = {}, {}
+    for results in result_lists:
+        for rank, (doc, _) in enumerate(results, start=1):
+            key = doc_key(doc)
+            docs.setdefault(key, doc)
+            fused[key] = fused.get(key, 0.0) + 1.0 / (rrf_k + rank)
+    best = sorted(fused, key=fused.get, reverse=True)[:k]
+    return [(docs[key], fused[key]) for key in best]
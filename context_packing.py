@@ -0,0 +1,182 @@
+"""Context packing between retrieval and the LLM, for app.py and evaluate.py.
+
+The retrieved chunks come from RecursiveCharacterTextSplitter(chunk_size=300,
+chunk_overlap=80), so neighbouring chunks of one post repeat up to 80
+characters, and similar posts yield near-identical chunks. pack() turns the
+top-k chunks into a shorter prompt context:
+
+1. Maximal marginal relevance orders the chunks by relevance to the question
+   minus similarity to the chunks already picked, using the chunk vectors
+   stored in the index and returned by retrieval.py (nothing is re-embedded).
+   Chunks within DUPLICATE_SIMILARITY of a picked one are dropped. Chunks
+   retrieved without vectors (keyword-only questions) keep their rank order.
+2. Chunks are kept in that order while the packed context fits the token budget.
+3. Kept chunks of the same post with consecutive positions are merged into one
+   document, with the repeated overlap removed.
+
+Tokens are counted with tiktoken (the encoding of gpt-3.5-turbo) when it is
+installed, else estimated as characters / 4.
+"""
+import os
+import threading
+
+import numpy as np
+from langchain_core.documents import Document
+
+TOKEN_BUDGET = 600            # tokens of packed context (10 raw chunks are ~750)
+MMR_LAMBDA = 0.7              # 1.0 = relevance only, 0.0 = diversity only
+DUPLICATE_SIMILARITY = 0.95   # cosine similarity above which a chunk is redundant
+MAX_OVERLAP_CHARS = 120       # longest prefix of a chunk searched for in its predecessor
+MIN_OVERLAP_CHARS = 8
+SEPARATOR = "\n\n"            # how create_stuff_documents_chain joins documents
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+    TOKEN_COUNTER = "tiktoken"
+
+    def count_tokens(text):
+        return len(_encoding.encode(text, disallowed_special=()))
+except Exception:  # tiktoken missing, or its encoding file cannot be downloaded
+    TOKEN_COUNTER = "characters / 4"
+
+    def count_tokens(text):
+        return (len(text) + 3) // 4
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def mmr_order(query_vector, vectors, mmr_lambda=MMR_LAMBDA, duplicate_similarity=DUPLICATE_SIMILARITY):
+    """(picked rows in MMR order, rows dropped as near-duplicates of a picked row)."""
+    vectors = _normalize(vectors)
+    relevance = vectors @ _normalize(query_vector)
+    similarity = vectors @ vectors.T
+    picked, dropped = [], []
+    closest = np.full(len(vectors), -np.inf)   # similarity to the nearest picked row
+    remaining = np.ones(len(vectors), dtype=bool)
+    while remaining.any():
+        score = mmr_lambda * relevance - (1 - mmr_lambda) * np.maximum(closest, 0)
+        row = int(np.argmax(np.where(remaining, score, -np.inf)))
+        remaining[row] = False
+        if closest[row] >= duplicate_similarity:
+            dropped.append(row)
+            continue
+        picked.append(row)
+        closest = np.maximum(closest, similarity[row])
+    return picked, dropped
+
+
+def _overlap(previous, text):
+    """Length of the longest prefix of text that previous ends with."""
+    for size in range(min(MAX_OVERLAP_CHARS, len(previous), len(text)), MIN_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(text[:size]):
+            return size
+    return 0
+
+
+def _position(doc):
+    position = doc.metadata.get("chunk")
+    try:
+        return int(position)
+    except (TypeError, ValueError):
+        return None
+
+
+def merge_adjacent(docs):
+    """Merge documents of one post (metadata "id") with consecutive "chunk" positions.
+
+    Merged documents keep the metadata of their first chunk plus "chunks", the
+    merged positions, and the place in docs of their best-ranked member.
+    """
+    runs = {}
+    order = sorted(range(len(docs)), key=lambda i: (str(docs[i].metadata.get("id")), _position(docs[i]), i))
+    merged = []
+    for i in order:
+        doc = docs[i]
+        key = doc.metadata.get("id")
+        position = _position(doc)
+        run = runs.get(key)
+        if key is not None and position is not None and run is not None and run["last"] + 1 == position:
+            size = _overlap(run["text"], doc.page_content)
+            run["text"] += doc.page_content[size:] if size else " " + doc.page_content
+            run["chunks"].append(position)
+            run["last"] = position
+            run["rank"] = min(run["rank"], i)
+            continue
+        run = {"doc": doc, "text": doc.page_content, "chunks": [position], "last": position, "rank": i}
+        if key is not None and position is not None:
+            runs[key] = run
+        merged.append(run)
+    merged.sort(key=lambda run: run["rank"])
+    return [
+        Document(page_content=run["text"], metadata={**run["doc"].metadata, "chunks": run["chunks"]})
+        if len(run["chunks"]) > 1 else run["doc"]
+        for run in merged
+    ]
+
+
+def context_tokens(docs):
+    return count_tokens(SEPARATOR.join(doc.page_content for doc in docs))
+
+
+class ContextPacker:
+    """Packs retrieved chunks into a token budget; keeps running totals of tokens saved."""
+
+    def __init__(self, budget=TOKEN_BUDGET, mmr_lambda=MMR_LAMBDA, duplicate_similarity=DUPLICATE_SIMILARITY):
+        self.budget = budget
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_similarity = duplicate_similarity
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    def pack(self, query_vector, docs, vectors):
+        """(packed documents, stats) for docs retrieved for query_vector; vectors[i] embeds docs[i].
+
+        Without vectors (None) the docs are taken in rank order, with no duplicate check.
+        """
+        stats = {"chunks_in": len(docs), "tokens_in": context_tokens(docs), "redundant": 0, "over_budget": 0}
+        picked = []
+        if docs:
+            if vectors is None:
+                order, dropped = range(len(docs)), []
+            else:
+                order, dropped = mmr_order(query_vector, vectors, self.mmr_lambda, self.duplicate_similarity)
+            stats["redundant"] = len(dropped)
+            for row in order:
+                candidate = picked + [docs[row]]
+                if picked and self.budget and context_tokens(merge_adjacent(candidate)) > self.budget:
+                    stats["over_budget"] += 1
+                    continue
+                picked = candidate
+        packed = merge_adjacent(picked)
+        stats.update(docs_out=len(packed), tokens_out=context_tokens(packed))
+        stats["tokens_saved"] = stats["tokens_in"] - stats["tokens_out"]
+        with self.lock:
+            self.requests += 1
+            self.tokens_in += stats["tokens_in"]
+            self.tokens_out += stats["tokens_out"]
+        return packed, stats
+
+    def stats(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "budget": self.budget,
+                "tokens_in": self.tokens_in,
+                "tokens_out": self.tokens_out,
+                "tokens_saved": self.tokens_in - self.tokens_out,
+            }
+
+
+def from_env():
+    """ContextPacker configured by CONTEXT_TOKENS (0 = no budget) and CONTEXT_MMR_LAMBDA."""
+    return ContextPacker(
+        budget=int(os.getenv("CONTEXT_TOKENS", TOKEN_BUDGET)),
+        mmr_lambda=float(os.getenv("CONTEXT_MMR_LAMBDA", MMR_LAMBDA)),
+    )
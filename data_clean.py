@@ -1,126 +1,142 @@
+import numpy as np
 import pandas as pd
-import re
-import matplotlib.pyplot as plt
-import seaborn as sns
+import argparse
+import hashlib
+import json
+import os
+
+from keyword_matcher import KeywordMatcher, keywords_dict
+from near_dup import near_duplicate_mask
+from plots import eda_charts, render_charts
+from text_utils import build_full_text, clean_text_series, parse_list
 
 import sys
 sys.stdout.reconfigure(line_buffering=True)
 
 
+RAW_PATH = "reddit_data.csv"
+CLEAN_PATH = "reddit_data_clean.csv"
+MANIFEST_PATH = "reddit_data_clean.manifest.json"
+CLEAN_VERSION = 1  # bump when the cleaning logic changes to force a full rebuild
+NEAR_DUP_THRESHOLD = 0.8  # estimated Jaccard similarity above which rows are collapsed
+
+parser = argparse.ArgumentParser(description="Clean scraped Reddit data and detect software mentions.")
+parser.add_argument("--full", action="store_true", help="ignore the manifest and reprocess every row")
+parser.add_argument("--near-dup-threshold", type=float, default=NEAR_DUP_THRESHOLD,
+                    help="collapse rows at least this similar (MinHash Jaccard); 0 disables")
+args = parser.parse_args()
+
+
+def row_hashes(frame):
+    """Stable 64-bit hash of each row's (id, title, content)."""
+    return pd.util.hash_pandas_object(frame[["id", "title", "content"]], index=False).astype("uint64")
+
+
+def dictionary_fingerprint(keywords, near_dup_threshold):
+    """Changes whenever keywords_dict, the near-duplicate threshold or CLEAN_VERSION changes."""
+    payload = json.dumps(
+        {"version": CLEAN_VERSION, "keywords": keywords, "near_dup_threshold": near_dup_threshold},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return None
+    with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
 # Load dataset
-df = pd.read_csv("reddit_data.csv")
+df = pd.read_csv(RAW_PATH)
 
 # Drop duplicates by ID (post or comment) or text
 df = df.drop_duplicates(subset=["id"], keep="last")
 df = df.drop_duplicates(subset=["title", "content"], keep="last")
-
-# Merge title + content into one field
-df["full_text"] = df[["title", "content"]].astype(str).agg(" ".join, axis=1)
-
-
-# Structured domain-specific dictionary
-keywords_dict = {
-    "Law": {
-        "Case Management": ["clio", "filevine", "smokeball", "practicepanther"],
-        "Research": ["lexisnexis", "westlaw"],
-        "Document Mgmt": ["imanage", "everlaw", "relativity", "document automation"],
-        "Payments": ["lawpay"],
-        "Other": ["ediscovery", "contract software"]
-    },
-    "Construction": {
-        "Design": ["autocad", "revit", "bim", "sketchup", "solidworks"],
-        "Project Mgmt": ["bluebeam", "procore", "plangrid", "primavera", "project management"],
-        "Other": ["construction software", "estimating software"]
-    },
-    "Tech": {
-        "DevOps": ["jira", "docker", "kubernetes", "ansible"],
-        "Cloud": ["aws", "azure", "gcp"],
-        "Security": ["firewall", "endpoint management", "security software"],
-        "Infra": ["servicenow", "splunk", "active directory", "linux"]
-    }
-}
-
-def find_keywords(text, keywords):
-    found = [kw for kw in keywords if re.search(rf"\b{re.escape(kw)}\b", text.lower())]
-    return found
-
-
-# Keyword detection by category
-df["keywords_found"] = [[] for _ in range(len(df))]
-df["software_flag"] = False
-
-for category, subcats in keywords_dict.items():
-    mask = df["category"] == category
-    for subcat, keywords in subcats.items():
-        df.loc[mask, "keywords_found"] = df.loc[mask].apply(
-            lambda row: list(set(row["keywords_found"]) | set(find_keywords(str(row["full_text"]), keywords))),
-            axis=1
-        )
+df["row_hash"] = row_hashes(df)
+
+
+# Incremental mode: only rows whose hash is not in the manifest are processed.
+# A changed keywords_dict changes the fingerprint and forces a full rebuild.
+# Rows collapsed as near-duplicates are left out of the manifest, so they are
+# checked again on every run and come back when the copy that was kept goes away.
+fingerprint = dictionary_fingerprint(keywords_dict, args.near_dup_threshold)
+manifest = None if args.full else load_manifest()
+incremental = (
+    manifest is not None
+    and manifest.get("fingerprint") == fingerprint
+    and os.path.exists(CLEAN_PATH)
+)
+if incremental:
+    seen = pd.Series(manifest["hashes"], dtype="uint64")
+    df_todo = df[~df["row_hash"].isin(seen)].copy()
+    print(f" Incremental clean: {len(df_todo)} new, edited or collapsed rows out of {len(df)}.")
+else:
+    df_todo = df.copy()
+    reason = "--full" if args.full else "no manifest" if manifest is None else "settings changed"
+    print(f" Full clean of {len(df_todo)} rows ({reason}).")
+
+
+# Merge title + content into one field (missing parts are left out, not "nan")
+df_todo["full_text"] = build_full_text(df_todo["title"], df_todo["content"])
+
+
+# Keyword detection by category (single pass per row, see keyword_matcher.py)
+matcher = KeywordMatcher(keywords_dict)
+df_todo["keywords_found"] = matcher.match_series(df_todo["full_text"], df_todo["category"])
+df_todo["subcategories_found"] = [
+    matcher.subcategories_of(found, category)
+    for found, category in zip(df_todo["keywords_found"], df_todo["category"])
+]
 
 # Flag rows with at least one keyword
-df["software_flag"] = df["keywords_found"].apply(lambda x: len(x) > 0)
+df_todo["software_flag"] = df_todo["keywords_found"].apply(lambda x: len(x) > 0)
 
 
 # Keep only rows with software/tool mentions
-df_clean = df[df["software_flag"] == True].copy()
-
-
-# Clean text for embeddings
-def clean_text(text):
-    text = str(text).lower()
-    text = re.sub(r"http\S+|www\S+", "", text)
-    text = re.sub(r"[^a-z\s]", "", text)
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
-
-df_clean["clean_text"] = df_clean["full_text"].apply(clean_text)
-
-
-# Save cleaned dataset + summary
-df_clean.to_csv("reddit_data_clean.csv", index=False)
-
-# Flatten keyword mentions for counts
-all_keywords = df_clean["keywords_found"].explode()
-keyword_counts = all_keywords.value_counts().reset_index()
-keyword_counts.columns = ["keyword", "count"]
-
-
-
-# EDA Plots
-# Plot 1: Mentions per category
-plt.figure(figsize=(6, 4))
-sns.countplot(data=df_clean, x="category", order=df_clean["category"].value_counts().index, palette="Set2")
-plt.title("Software Mentions by Category")
-plt.xlabel("Category")
-plt.ylabel("Count of Mentions")
-plt.show()
-
-# Plot 2: Top Software Mentions
-top_keywords = keyword_counts.head(10)
-plt.figure(figsize=(8, 5))
-sns.barplot(x=top_keywords["count"], y=top_keywords["keyword"], palette="viridis")
-plt.title("Top 10 Most Mentioned Tools/Software")
-plt.xlabel("Number of Mentions")
-plt.ylabel("Software/Tool")
-plt.show()
-
-# Plot 3: Subreddit distribution
-top_subs = df_clean["subreddit"].value_counts().head(10)
-plt.figure(figsize=(8, 5))
-sns.barplot(x=top_subs.values, y=top_subs.index, palette="mako")
-plt.title("Top 10 Subreddits with Software Mentions")
-plt.xlabel("Number of Mentions")
-plt.ylabel("Subreddit")
-plt.show()
-
-# Plot 4: Time trend of mentions
-df_clean["created_utc"] = pd.to_datetime(df_clean["created_utc"], errors="coerce")
-df_trend = df_clean.groupby(df_clean["created_utc"].dt.date).size()
-
-plt.figure(figsize=(10, 5))
-df_trend.plot(kind="line", marker="o")
-plt.title("Trend of Software Mentions Over Time")
-plt.xlabel("Date")
-plt.ylabel("Number of Mentions")
-plt.grid(True)
-plt.show()
+df_new_clean = df_todo[df_todo["software_flag"] == True].copy()
+
+
+# Clean text for embeddings (vectorized, see text_utils.clean_text)
+df_new_clean["clean_text"] = clean_text_series(df_new_clean["full_text"])
+
+
+# Merge with previously cleaned rows: edited rows are replaced (or dropped if
+# they no longer mention a tool), and rows no longer in the raw data go away.
+if incremental:
+    df_old = pd.read_csv(CLEAN_PATH)
+    df_old = df_old[df_old["id"].isin(df["id"]) & ~df_old["id"].isin(df_todo["id"])]
+    for col in ["keywords_found", "subcategories_found"]:
+        df_old[col] = df_old[col].apply(parse_list)
+    df_clean = pd.concat([df_old, df_new_clean], ignore_index=True)
+    df_clean = df_clean.drop_duplicates(subset=["title", "content"], keep="last")
+    # Back in raw order, so near-duplicate collapsing keeps the row a full clean keeps
+    raw_position = pd.Series(np.arange(len(df)), index=df["id"])
+    df_clean = df_clean.iloc[np.argsort(raw_position.reindex(df_clean["id"]).to_numpy(), kind="stable")]
+else:
+    df_clean = df_new_clean
+df_clean = df_clean.drop(columns=["row_hash"])
+
+
+# Collapse near-duplicates (cross-posts, quoted replies, bot boilerplate) within
+# each category, keeping the latest row, so they are not embedded and indexed twice.
+collapsed_ids = pd.Series([], dtype=object)
+if args.near_dup_threshold > 0:
+    near_dups = pd.Series(False, index=df_clean.index)
+    for _, group in df_clean.groupby("category"):
+        near_dups[group.index] = near_duplicate_mask(group["clean_text"].tolist(), args.near_dup_threshold)
+    collapsed_ids = df_clean.loc[near_dups, "id"]
+    df_clean = df_clean[~near_dups]
+    print(f" Collapsed {int(near_dups.sum())} near-duplicate rows (similarity >= {args.near_dup_threshold}).")
+
+
+# Save cleaned dataset + manifest
+df_clean.to_csv(CLEAN_PATH, index=False)
+with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
+    json.dump({"fingerprint": fingerprint, "hashes": df.loc[~df["id"].isin(collapsed_ids), "row_hash"].tolist()}, f)
+print(f" Saved {len(df_clean)} cleaned rows to {CLEAN_PATH} ({len(df_new_clean)} from this run).")
+
+# EDA charts: rendered headless into static/plots/ by a background process,
+# skipping charts whose data did not change
+render_charts(eda_charts(df_clean))
@@ -1,18 +1,30 @@
 import praw
-import pandas as pd
+from praw.models import MoreComments
 import os
 import time
+import random
+import json
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
+from reddit_store import RedditStore, append_csv
+
 import sys
 sys.stdout.reconfigure(line_buffering=True)
 
 # --------- SETUP ----------
-reddit = praw.Reddit(
-    client_id="qL6M97vuwERUMPfq3f53XQ",
-    client_secret="XsJsBSfZj3jZNccXiJG77CtDanDojg",
-    user_agent="MSDS 692 Scrape"
-)
+def make_reddit():
+    """Create a PRAW client. PRAW is not thread-safe, so each worker gets its own."""
+    return praw.Reddit(
+        client_id="qL6M97vuwERUMPfq3f53XQ",
+        client_secret="XsJsBSfZj3jZNccXiJG77CtDanDojg",
+        user_agent="MSDS 692 Scrape"
+    )
+
+reddit = make_reddit()
 
 # Subreddit categories provided by the business
 subreddit_categories = {
@@ -34,34 +46,156 @@ subreddit_categories = {
 
 POST_LIMIT = 100     # posts per subreddit
 COMMENT_LIMIT = 15   # cap comments per post
-SLEEP_TIME = 8       # wait between subreddit fetches
+COMMENT_POLICY = "bfs"  # "bfs" walks replies level by level, "top_level" reads only top-level comments
+SLEEP_TIME = 8       # wait between subreddit fetches (sequential mode)
 output_file = "reddit_data.csv"
-# log_file = "scrape_log.txt"
-
-# Load existing data (if any)
-if os.path.exists(output_file):
-    df_existing = pd.read_csv(output_file, parse_dates=["created_utc"])
-else:
-    df_existing = pd.DataFrame(columns=[
-        "id", "category", "subreddit", "title", "content", "author", 
-        "score", "num_comments", "created_utc", "edited", "type", "parent_id"
-    ])
-
-# Helper: get last scrape time per subreddit
-last_times = (
-    df_existing.groupby("subreddit")["created_utc"].max().to_dict()
-    if not df_existing.empty else {}
-)
-
-def fetch_subreddit_posts(subreddit_name, category, limit=100, last_time=None):
-    subreddit = reddit.subreddit(subreddit_name)
+LOG_PATH = "scrape_log.txt"
+METRICS_PATH = "scrape_metrics.jsonl"
+METRICS_PREFIX = "METRICS "  # app.py turns these stdout lines into SSE "metrics" events
+
+# Concurrent mode settings
+MAX_WORKERS = 4            # subreddits fetched in parallel
+REQUESTS_PER_MINUTE = 100  # Reddit OAuth quota per client id
+BURST = 10                 # requests allowed back-to-back before throttling
+MAX_RETRIES = 3            # retries per subreddit before giving up
+BACKOFF_BASE = 2           # seconds, doubled on every retry
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by all workers to stay under the API quota."""
+
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            self.sleep(wait)
+
+
+class ScrapeMetrics:
+    """Throughput counters for one subreddit fetch."""
+
+    def __init__(self, category, subreddit):
+        self.category = category
+        self.subreddit = subreddit
+        self.api_calls = 0
+        self.retries = 0
+        self.skipped_old_posts = 0
+        self.skipped_old_comments = 0
+        self.posts = 0
+        self.comments = 0
+        self.started = time.perf_counter()
+        self.wall_time = 0.0
+
+    def api_call(self, limiter=None):
+        if limiter:
+            limiter.acquire()
+        self.api_calls += 1
+
+    def retry(self):
+        # API calls of failed attempts still count, skips are recounted
+        self.retries += 1
+        self.skipped_old_posts = self.skipped_old_comments = 0
+
+    def finish(self, rows):
+        self.wall_time = time.perf_counter() - self.started
+        self.posts = sum(1 for row in rows if row["type"] == "post")
+        self.comments = len(rows) - self.posts
+
+    def record(self, run_id=None):
+        rows = self.posts + self.comments
+        return {
+            "ts": datetime.now().isoformat(timespec="seconds"),
+            "run_id": run_id,
+            "category": self.category,
+            "subreddit": self.subreddit,
+            "wall_time_s": round(self.wall_time, 3),
+            "api_calls": self.api_calls,
+            "retries": self.retries,
+            "posts": self.posts,
+            "comments": self.comments,
+            "skipped_old_posts": self.skipped_old_posts,
+            "skipped_old_comments": self.skipped_old_comments,
+            "rows_per_sec": round(rows / self.wall_time, 2) if self.wall_time else 0.0,
+        }
+
+
+def log(message):
+    print(message, flush=True)
+    with open(LOG_PATH, "a", encoding="utf-8") as f:
+        f.write(message + "\n")
+
+
+def write_metrics(record):
+    """Append a metrics record to METRICS_PATH and stream it to stdout."""
+    line = json.dumps(record)
+    with open(METRICS_PATH, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+    print(METRICS_PREFIX + line, flush=True)
+
+
+def iter_comments(forest, policy=COMMENT_POLICY):
+    """Yield loaded comments lazily, top-level first, without flattening the tree.
+
+    Only reply forests are queued, so stopping early never touches the rest of
+    the thread. "More comments" stubs are skipped rather than expanded.
+    """
+    pending = deque([forest])
+    while pending:
+        for comment in pending.popleft():
+            if isinstance(comment, MoreComments):
+                continue
+            yield comment
+            if policy == "bfs":
+                pending.append(comment.replies)
+
+
+def collect_comments(forest, last_time=None, limit=COMMENT_LIMIT, policy=COMMENT_POLICY, metrics=None):
+    """Return up to `limit` comments newer than last_time, stopping as soon as it has them."""
+    comments = []
+    if limit <= 0:
+        return comments
+    for comment in iter_comments(forest, policy):
+        # Skip old comments
+        if last_time and datetime.utcfromtimestamp(comment.created_utc) <= last_time:
+            if metrics:
+                metrics.skipped_old_comments += 1
+            continue
+        comments.append(comment)
+        if len(comments) >= limit:
+            break
+    return comments
+
+
+def fetch_subreddit_posts(subreddit_name, category, limit=100, last_time=None, client=None, limiter=None,
+                          metrics=None):
+    client = client or reddit
+    metrics = metrics or ScrapeMetrics(category, subreddit_name)
+    subreddit = client.subreddit(subreddit_name)
     posts_data = []
 
+    # One API call for the listing, one per post for its comments
+    metrics.api_call(limiter)
     for post in subreddit.new(limit=limit):
         post_time = datetime.utcfromtimestamp(post.created_utc)
 
         # Skip if this post is older/equal to last scraped one
         if last_time and post_time <= last_time:
+            metrics.skipped_old_posts += 1
             continue
 
         # Post row
@@ -82,14 +216,10 @@ def fetch_subreddit_posts(subreddit_name, category, limit=100, last_time=None):
         posts_data.append(post_data)
 
         # Comments rows
-        post.comments.replace_more(limit=0)
-        for comment in post.comments.list()[:COMMENT_LIMIT]:
+        metrics.api_call(limiter)
+        for comment in collect_comments(post.comments, last_time, metrics=metrics):
             comment_time = datetime.utcfromtimestamp(comment.created_utc)
 
-            # Skip old comments
-            if last_time and comment_time <= last_time:
-                continue
-
             comment_data = {
                 "id": comment.id,
                 "category": category,
@@ -109,55 +239,144 @@ def fetch_subreddit_posts(subreddit_name, category, limit=100, last_time=None):
     return posts_data
 
 
-# --------- MAIN SCRIPT ----------
-all_data = []
-for category, subreddits in subreddit_categories.items():
-    for sub in subreddits:
+def fetch_with_retry(subreddit_name, category, last_time=None, client=None, limiter=None,
+                     retries=MAX_RETRIES, backoff=BACKOFF_BASE, metrics=None):
+    """Fetch one subreddit, retrying with exponential backoff and jitter."""
+    for attempt in range(retries + 1):
+        try:
+            return fetch_subreddit_posts(subreddit_name, category, POST_LIMIT, last_time, client, limiter, metrics)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            if metrics:
+                metrics.retry()
+            delay = backoff * 2 ** attempt + random.uniform(0, 1)
+            print(f"Retrying r/{subreddit_name} in {delay:.1f}s ({e})")
+            time.sleep(delay)
+
+
+def collect_sequentially(jobs, last_times, client=None, sleep_time=SLEEP_TIME):
+    """Original one-at-a-time loop with a fixed sleep between subreddits."""
+    for category, sub in jobs:
         try:
             print(f"Fetching data from r/{sub} (Category: {category})...")
 
             last_time = last_times.get(sub)  # last scraped time for this subreddit
-            all_data.extend(fetch_subreddit_posts(sub, category, POST_LIMIT, last_time))
+            metrics = ScrapeMetrics(category, sub)
+            rows = fetch_subreddit_posts(sub, category, POST_LIMIT, last_time, client, metrics=metrics)
+            metrics.finish(rows)
+            yield category, sub, rows, metrics
 
-            time.sleep(SLEEP_TIME)
+            time.sleep(sleep_time)
         except Exception as e:
             print(f"Skipping r/{sub}: {e}")
-            time.sleep(SLEEP_TIME)
+            time.sleep(sleep_time)
 
-# Convert to DataFrame
-df_new = pd.DataFrame(all_data)
 
-# Combine with existing data
-df_combined = pd.concat([df_existing, df_new], ignore_index=True)
-df_combined = df_combined.drop_duplicates(subset=["id"], keep="last")
+def collect_concurrently(jobs, last_times, client_factory=make_reddit, workers=MAX_WORKERS, limiter=None):
+    """Fetch subreddits on a thread pool, yielding results as each one finishes."""
+    limiter = limiter or TokenBucket(REQUESTS_PER_MINUTE / 60, BURST)
+    local = threading.local()
 
-# Save updated dataset
-df_combined.to_csv(output_file, index=False)
+    def run(category, sub):
+        if not hasattr(local, "client"):
+            local.client = client_factory()
+        print(f"Fetching data from r/{sub} (Category: {category})...")
+        metrics = ScrapeMetrics(category, sub)
+        rows = fetch_with_retry(sub, category, last_times.get(sub), local.client, limiter, metrics=metrics)
+        metrics.finish(rows)
+        return rows, metrics
 
-# Logging
-new_rows_added = len(df_new)
-# log_entry = f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Added {new_rows_added} new rows. Total dataset size: {len(df_combined)}\n"
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run, category, sub): (category, sub) for category, sub in jobs}
+        for future in as_completed(futures):
+            category, sub = futures[future]
+            try:
+                yield (category, sub, *future.result())
+            except Exception as e:
+                print(f"Skipping r/{sub}: {e}")
 
-# with open(log_file, "a") as f:
-#     f.write(log_entry)
-# data_collection.py
-import sys, time, os
 
-LOG_PATH = "scrape_log.txt"
+# --------- MAIN SCRIPT ----------
+def main():
+    parser = argparse.ArgumentParser(description="Scrape new Reddit posts and comments.")
+    parser.add_argument("--concurrent", action="store_true",
+                        help="fetch subreddits in parallel behind a shared rate limiter")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS,
+                        help="number of parallel fetchers in concurrent mode")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the last unfinished run, skipping subreddits it already saved")
+    parser.add_argument("--rebuild-csv", action="store_true",
+                        help=f"rewrite {output_file} from the database instead of appending new rows")
+    args = parser.parse_args()
 
-def log(message):
-    print(message, flush=True)
-    with open(LOG_PATH, "a", encoding="utf-8") as f:
-        f.write(message + "\n")
+    store = RedditStore()
+    if store.is_empty() and os.path.exists(output_file):
+        print(f" Importing existing {output_file} into {store.path}...")
+        store.import_csv(output_file)
+
+    # Helper: get last scrape time per subreddit (indexed lookup)
+    last_times = store.last_times(sub for subs in subreddit_categories.values() for sub in subs)
+
+    jobs = [(category, sub) for category, subs in subreddit_categories.items() for sub in subs]
+
+    # Each subreddit is checkpointed as soon as it is fetched, so a crashed run
+    # can be resumed without re-fetching the subreddits it already saved.
+    run_id = store.latest_unfinished_run() if args.resume else None
+    if run_id is None:
+        if args.resume:
+            print(" No unfinished run to resume. Starting a new run.")
+        run_id = store.start_run()
+    else:
+        done = store.completed_subreddits(run_id)
+        jobs = [(category, sub) for category, sub in jobs if sub not in done]
+        print(f" Resuming run {run_id}: {len(done)} subreddits already saved, {len(jobs)} left.")
+
+    if args.concurrent:
+        results = collect_concurrently(jobs, last_times, workers=args.workers)
+    else:
+        results = collect_sequentially(jobs, last_times)
 
-log(" Starting data collection...")
+    print(" Starting data collection...")
+    started = time.perf_counter()
+    new_rows_added = 0
+    saved = set()
+    for category, sub, rows, metrics in results:
+        # CSV first: if we die before the checkpoint, the resumed run appends
+        # the rows again and the cleaning step drops the duplicate ids.
+        if not args.rebuild_csv:
+            append_csv(rows, output_file)
+        new_rows_added += store.checkpoint(run_id, sub, rows)
+        write_metrics(metrics.record(run_id))
+        saved.add(sub)
 
-for i in range(10):  # simulate 10 progress updates
-    time.sleep(30)   # simulate a long task
-    log(f"Progress: {(i+1)*10}% complete")
+    # Subreddits that failed every attempt keep the run open for --resume
+    failed = [sub for _, sub in jobs if sub not in saved]
+    if failed:
+        print(f" {len(failed)} subreddits failed ({', '.join(failed)}). "
+              f"Run {run_id} left unfinished; rerun with --resume to retry them.")
+    else:
+        store.finish_run(run_id)
+    if args.rebuild_csv:
+        store.export_csv(output_file)
+    total_rows = store.count()
+    store.close()
 
-log(" Data collection finished successfully!")
+    # Logging
+    elapsed = time.perf_counter() - started
+    write_metrics({
+        "ts": datetime.now().isoformat(timespec="seconds"),
+        "run_id": run_id,
+        "subreddit": None,
+        "subreddits": len(jobs),
+        "wall_time_s": round(elapsed, 3),
+        "rows": new_rows_added,
+        "rows_per_sec": round(new_rows_added / elapsed, 2) if elapsed else 0.0,
+        "mode": "concurrent" if args.concurrent else "sequential",
+    })
+    log(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Added {new_rows_added} new rows. Total dataset size: {total_rows}")
+    print(f"Data collection complete! {new_rows_added} new rows added. Total = {total_rows}")
 
 
-print(f"Data collection complete! {new_rows_added} new rows added. Total = {len(df_combined)}")
-# print(f"Log entry written to {log_file}")
+if __name__ == "__main__":
+    main()
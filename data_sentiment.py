@@ -1,94 +1,101 @@
 import pandas as pd
+import argparse
 import re
-import matplotlib.pyplot as plt
-import seaborn as sns
 from nltk.corpus import stopwords
-from nltk import word_tokenize, bigrams
-from nltk.sentiment import SentimentIntensityAnalyzer
-from collections import Counter
 import nltk
 
+from ngram_engine import pain_point_table
+from ngram_store import NgramStore
+from plots import render_charts, sentiment_charts
+from sentiment_cache import SentimentCache, cached_scores
+from sentiment_engine import analyzer_fingerprint, default_workers, label_scores, score_texts
+from text_utils import parse_list, strip_nan_words
+
 import sys
 sys.stdout.reconfigure(line_buffering=True)
 
 
-# Setup
-nltk.download("vader_lexicon")
-nltk.download("punkt")
-nltk.download("stopwords")
-
-stop_words = set(stopwords.words("english"))
-sia = SentimentIntensityAnalyzer()
+PAIN_POINTS_PATH = "pain_points.csv"
 
 
-# Load dataset
-df_clean = pd.read_csv("reddit_data_clean.csv")
+# The pipeline runs under main() because sentiment scoring uses a process pool,
+# whose workers re-import this module on platforms that spawn them.
+def main():
+    parser = argparse.ArgumentParser(description="Score sentiment and extract pain points.")
+    parser.add_argument("--workers", type=int, default=default_workers(),
+                        help="processes used for VADER scoring (default: all cores)")
+    parser.add_argument("--no-cache", action="store_true", help="score every row without reading or updating sentiment_cache.db")
+    args = parser.parse_args()
 
+    # Setup
+    nltk.download("vader_lexicon")
+    nltk.download("stopwords")
 
-# Fix: remove literal "nan" word, not drop rows
-def clean_nan_words(text):
-    text = str(text).lower()
-    text = text.replace("nan ", "").replace(" nan", "").strip()
-    return text
+    stop_words = set(stopwords.words("english"))
 
-df_clean["clean_text"] = df_clean["clean_text"].apply(clean_nan_words)
 
+    # Load dataset
+    df_clean = pd.read_csv("reddit_data_clean.csv")
 
-# Sentiment Analysis
-def get_sentiment(text):
-    score = sia.polarity_scores(str(text))["compound"]
-    if score > 0.05:
-        return "positive"
-    elif score < -0.05:
-        return "negative"
-    else:
-        return "neutral"
 
-df_clean["sentiment"] = df_clean["clean_text"].apply(get_sentiment)
+    # Fix: remove literal "nan" word, not drop rows (only older cleaned files contain it)
+    df_clean["clean_text"] = strip_nan_words(df_clean["clean_text"])
 
 
-# Stopword cleanup for pain points
-def preprocess_for_painpoints(text):
-    tokens = word_tokenize(str(text).lower())
-    tokens = [t for t in tokens if t.isalpha() and t not in stop_words]
-    return tokens
+    # Sentiment Analysis (parallel VADER, see sentiment_engine.py). Scores of texts
+    # seen by earlier runs come from sentiment_cache.db.
+    if args.no_cache:
+        scores, hits = score_texts(df_clean["clean_text"], workers=args.workers), 0
+    else:
+        cache = SentimentCache(analyzer_fingerprint())
+        if cache.invalidated:
+            print(" Lexicon or thresholds changed, sentiment cache cleared.")
+        scores, hits = cached_scores(df_clean["clean_text"], cache, workers=args.workers)
+        cache.close()
+    df_clean["sentiment"] = label_scores(scores)
+    hit_rate = hits / len(df_clean) if len(df_clean) else 0.0
+    print(f" Sentiment cache: {hits}/{len(df_clean)} hits ({hit_rate:.1%}), "
+          f"scored {len(df_clean) - hits} rows with {args.workers} workers.")
 
-df_clean["tokens"] = df_clean["clean_text"].apply(preprocess_for_painpoints)
 
+    # Pain point extraction (negative posts only): one sparse document-term matrix,
+    # top n-grams per category, subreddit and matched keyword (see ngram_engine.py)
+    negative_texts = df_clean[df_clean["sentiment"] == "negative"].reset_index(drop=True)
+    negative_texts["keywords_found"] = negative_texts["keywords_found"].apply(parse_list)
+    pain_points, unigram_counts, bigram_counts = pain_point_table(negative_texts, stop_words)
+    pain_points.to_csv(PAIN_POINTS_PATH, index=False)
+    print(f" Saved top n-grams of {len(negative_texts)} negative rows per category, subreddit "
+          f"and keyword to {PAIN_POINTS_PATH}.")
 
-# Pain point extraction (negative posts only)
-negative_texts = df_clean[df_clean["sentiment"] == "negative"]
 
-# Unigrams
-all_unigrams = [tok for tokens in negative_texts["tokens"] for tok in tokens]
-unigram_counts = Counter(all_unigrams).most_common(20)
+    columns_to_keep = ["id", "category", "subreddit", "full_text",
+                       "keywords_found", "clean_text", "sentiment"]
 
-# Bigrams
-all_bigrams = [bg for tokens in negative_texts["tokens"] for bg in bigrams(tokens)]
-bigram_counts = Counter(all_bigrams).most_common(20)
+    df_final = df_clean[columns_to_keep].copy()
+    df_final.to_csv("reddit_data_sentiment.csv", index=False)
 
+    print(f"Saved cleaned + sentiment dataset with {len(df_final)} rows to reddit_data_sentiment.csv")
 
-columns_to_keep = ["id", "category", "subreddit", "full_text", 
-                   "keywords_found", "clean_text", "sentiment"]
+    # Live n-gram counts behind the app's /painpoints endpoint (see ngram_store.py)
+    ngram_store = NgramStore()
+    added, removed = ngram_store.sync(df_final, stop_words)
+    ngram_store.close()
+    print(f" N-gram store: counted {added} new or changed rows, subtracted {removed} changed or removed rows.")
 
-df_final = df_clean[columns_to_keep].copy()
-df_final.to_csv("reddit_data_sentiment.csv", index=False)
 
-print(f"Saved cleaned + sentiment dataset with {len(df_final)} rows to reddit_data_sentiment.csv")
+    # Summary Outputs
+    print("\nSentiment distribution:")
+    print(df_final["sentiment"].value_counts())
 
+    print("\nTop words in negative mentions (after stopword removal):")
+    print(pd.DataFrame(unigram_counts, columns=["word", "count"]))
 
-# Summary Outputs
-print("\nSentiment distribution:")
-print(df_final["sentiment"].value_counts())
+    print("\nTop bigrams in negative mentions:")
+    print(pd.DataFrame(bigram_counts, columns=["bigram", "count"]))
 
-print("\nTop words in negative mentions (after stopword removal):")
-print(pd.DataFrame(unigram_counts, columns=["word", "count"]))
+    # Sentiment pie + pain point charts (rendered in the background, see plots.py)
+    render_charts(sentiment_charts(df_final, unigram_counts, bigram_counts))
 
-print("\nTop bigrams in negative mentions:")
-print(pd.DataFrame(bigram_counts, columns=["bigram", "count"]))
 
-# Sentiment Distribution Pie Chart
-df_final["sentiment"].value_counts().plot(kind="pie", autopct='%1.2f%%')
-plt.title("Sentiment Distribution")
-plt.ylabel("")
-plt.show()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
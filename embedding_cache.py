@@ -0,0 +1,286 @@
+"""Persistent embedding cache shared by store_index.py, app.py and evaluate.py.
+
+Vectors are keyed by (model id, text hash). Each model id gets a directory under
+embedding_cache/ holding three append-only files whose row i belongs together:
+
+    keys.bin     16-byte BLAKE2b hash of the text (written last, so it commits a row)
+    vectors.f32  float32 vectors, read through a memory map
+    usage.i64    tick of the last lookup that used the row, for LRU compaction
+
+A lookup is a dict probe plus a read from the memory map. When the cache holds
+more than max_entries rows it is compacted: the most recently used rows are
+copied into a fresh directory that replaces the old one, and a new generation
+stamp is written to the lock file (<dir>.lock) so other processes reload.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import uuid
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+CACHE_DIR = "embedding_cache"
+MAX_ENTRIES = 1_000_000
+COMPACT_TO = 0.8   # share of max_entries kept by a compaction
+KEY_SIZE = 16
+
+
+def text_key(text, kind="doc"):
+    """Queries and documents are cached apart, since some models embed them differently."""
+    return hashlib.blake2b(f"{kind}\0{text}".encode("utf-8"), digest_size=KEY_SIZE).digest()
+
+
+try:
+    import fcntl
+
+    def _lock_file(f):
+        fcntl.flock(f, fcntl.LOCK_EX)
+
+    def _unlock_file(f):
+        fcntl.flock(f, fcntl.LOCK_UN)
+except ImportError:  # Windows
+    import msvcrt
+
+    def _lock_file(f):
+        f.seek(0)  # msvcrt locks bytes from the current position
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _unlock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class EmbeddingCache:
+    """Memory-mapped vectors of one embedding model.
+
+    Several processes may share a cache (the app runs store_index.py and
+    evaluate.py as subprocesses): lookups (which write usage ticks), writes and
+    compactions hold a lock file, and every call first picks up rows appended
+    by others.
+    """
+
+    def __init__(self, model_id, root=CACHE_DIR, max_entries=MAX_ENTRIES):
+        self.model_id = model_id
+        self.path = os.path.join(root, re.sub(r"[^A-Za-z0-9_.+-]", "_", model_id))
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._generation = None
+        os.makedirs(self.path, exist_ok=True)
+        with self._locked() as lock_file:
+            self._sync(lock_file)
+
+    # --------- FILES ----------
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """The thread lock plus the lock file, so no other process compacts meanwhile."""
+        with self.lock, open(self.path + ".lock", "a+b") as lock_file:
+            _lock_file(lock_file)
+            try:
+                yield lock_file
+            finally:
+                _unlock_file(lock_file)
+
+    def _keys_size(self):
+        try:
+            return os.path.getsize(self._file("keys.bin"))
+        except FileNotFoundError:
+            return 0
+
+    def _load(self):
+        """Read the key index from scratch (first use, or the cache was compacted)."""
+        self.dim = None
+        self.index = {}
+        self.rows = 0
+        self.tick = 0
+        self._release_maps()
+        self._read_new_keys()
+        if self.rows:
+            self.tick = int(self._usage_map().max()) + 1
+
+    def _read_new_keys(self):
+        if self.dim is None and os.path.exists(self._file("meta.json")):
+            with open(self._file("meta.json"), "r", encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+        if self.dim is None or not os.path.exists(self._file("keys.bin")):
+            return
+        with open(self._file("keys.bin"), "rb") as f:
+            f.seek(self.rows * KEY_SIZE)
+            data = f.read()
+        # Keys are written last, so their rows are complete in the other files
+        for offset in range(0, len(data) - len(data) % KEY_SIZE, KEY_SIZE):
+            self.index[data[offset:offset + KEY_SIZE]] = self.rows
+            self.rows += 1
+
+    def _sync(self, lock_file):
+        """Pick up rows appended, or a compaction done, by another process (lock held).
+
+        Compactions are told apart by the generation stamp in the lock file, not by
+        the inode of keys.bin, which the filesystem may hand to a later keys.bin.
+        """
+        lock_file.seek(0)
+        generation = lock_file.read()
+        size = self._keys_size()
+        if generation != self._generation or size < self.rows * KEY_SIZE:
+            self._generation = generation
+            self._load()
+        elif size >= (self.rows + 1) * KEY_SIZE:
+            self._read_new_keys()
+
+    def _vector_map(self):
+        if self._vectors is None or len(self._vectors) < self.rows:
+            self._vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r",
+                                      shape=(self.rows, self.dim))
+        return self._vectors
+
+    def _usage_map(self):
+        if self._usage is None or len(self._usage) < self.rows:
+            self._usage = np.memmap(self._file("usage.i64"), dtype=np.int64, mode="r+", shape=(self.rows,))
+        return self._usage
+
+    def _release_maps(self):
+        self._vectors = None
+        self._usage = None
+
+    # --------- LOOKUPS ----------
+    def __len__(self):
+        return self.rows
+
+    def get_many(self, keys):
+        """(vectors, found): vectors of found keys, zeros elsewhere."""
+        with self._locked() as lock_file:
+            self._sync(lock_file)
+            rows = np.array([self.index.get(key, -1) for key in keys], dtype=np.int64)
+            found = rows >= 0
+            self.hits += int(found.sum())
+            self.misses += int((~found).sum())
+            if not found.any():
+                return None, found
+            vectors = np.zeros((len(keys), self.dim), dtype=np.float32)
+            vectors[found] = self._vector_map()[rows[found]]
+            self._usage_map()[rows[found]] = self.tick
+            self.tick += 1
+            return vectors, found
+
+    def put_many(self, keys, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._locked() as lock_file:
+            self._sync(lock_file)
+            self._append(keys, vectors)
+            if self.rows > self.max_entries:
+                self._compact(lock_file)
+
+    def _append(self, keys, vectors):
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            with open(self._file("meta.json"), "w", encoding="utf-8") as f:
+                json.dump({"model_id": self.model_id, "dim": self.dim}, f)
+        new, seen = [], set()
+        for i, key in enumerate(keys):
+            if key not in self.index and key not in seen:
+                seen.add(key)
+                new.append(i)
+        if not new:
+            return
+        # Drop vector/usage records a crashed writer left without a key
+        for name, row_size in [("vectors.f32", 4 * self.dim), ("usage.i64", 8)]:
+            with open(self._file(name), "ab") as f:
+                f.truncate(self.rows * row_size)
+        with open(self._file("vectors.f32"), "ab") as f:
+            f.write(vectors[new].tobytes())
+        with open(self._file("usage.i64"), "ab") as f:
+            f.write(np.full(len(new), self.tick, dtype=np.int64).tobytes())
+        with open(self._file("keys.bin"), "ab") as f:
+            f.write(b"".join(keys[i] for i in new))
+        for i in new:
+            self.index[keys[i]] = self.rows
+            self.rows += 1
+
+    # --------- COMPACTION ----------
+    def _compact(self, lock_file):
+        """Keep the COMPACT_TO * max_entries most recently used rows."""
+        keep = int(self.max_entries * COMPACT_TO)
+        usage = np.array(self._usage_map())
+        rows = np.sort(np.argsort(-usage, kind="stable")[:keep])
+        keys_by_row = [None] * self.rows
+        for key, row in self.index.items():
+            keys_by_row[row] = key
+
+        tmp = self.path + ".compact"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        np.asarray(self._vector_map()[rows]).tofile(os.path.join(tmp, "vectors.f32"))
+        usage[rows].tofile(os.path.join(tmp, "usage.i64"))
+        with open(os.path.join(tmp, "keys.bin"), "wb") as f:
+            f.write(b"".join(keys_by_row[row] for row in rows))
+        shutil.copy(self._file("meta.json"), os.path.join(tmp, "meta.json"))
+
+        self._release_maps()
+        old = self.path + ".old"
+        shutil.rmtree(old, ignore_errors=True)
+        os.replace(self.path, old)
+        os.replace(tmp, self.path)
+        shutil.rmtree(old, ignore_errors=True)
+        self._generation = uuid.uuid4().bytes
+        lock_file.truncate(0)
+        lock_file.write(self._generation)
+        lock_file.flush()
+        self._load()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"entries": self.rows, "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0}
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an Embeddings object; only texts missing from the cache reach it."""
+
+    def __init__(self, embeddings, cache=None):
+        self.embeddings = embeddings
+        self.model_id = getattr(embeddings, "model_id", type(embeddings).__name__)
+        self.cache = cache if cache is not None else EmbeddingCache(self.model_id)
+
+    def __getattr__(self, name):
+        # batch_size, workers, ... of the wrapped engine
+        try:
+            embeddings = self.__dict__["embeddings"]
+        except KeyError:  # not set yet, e.g. while copy or pickle rebuilds the object
+            raise AttributeError(name) from None
+        return getattr(embeddings, name)
+
+    def _embed(self, texts, kind, compute):
+        texts = [str(t) for t in texts]
+        keys = [text_key(t, kind) for t in texts]
+        vectors, found = self.cache.get_many(keys)
+        if found.all():
+            return vectors
+        # Repeated texts are embedded once
+        missing = np.flatnonzero(~found)
+        first = {}
+        for i in missing:
+            first.setdefault(keys[i], i)
+        computed = np.asarray(compute([texts[i] for i in first.values()]), dtype=np.float32)
+        self.cache.put_many(list(first), computed)
+        if vectors is None:
+            vectors = np.zeros((len(texts), computed.shape[1]), dtype=np.float32)
+        position = {key: n for n, key in enumerate(first)}
+        vectors[missing] = computed[[position[keys[i]] for i in missing]]
+        return vectors
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        return self._embed(texts, "doc", self.embeddings.embed_documents).tolist()
+
+    def embed_query(self, text):
+        return self._embed([text], "query", lambda texts: [self.embeddings.embed_query(texts[0])])[0].tolist()
@@ -0,0 +1,172 @@
+"""CPU embedding engine shared by store_index.py, app.py and evaluate.py.
+
+FastEmbeddings keeps LangChain's Embeddings interface, so it drops in where
+HuggingFaceEmbeddings was used, and adds what matters on CPU-only hosts:
+
+- a configurable batch size,
+- length-sorted batches, so short chunks are not padded to the longest chunk
+  of a random batch,
+- a process pool for large embed_documents calls, every worker holding its own
+  copy of the model (and its share of the cores). The pool is only started by
+  the first call large enough to use it (MIN_TEXTS_PER_WORKER texts per worker),
+  so query embedding never starts it. Workers are forked by default, because
+  store_index.py is a plain script that spawned workers would re-run. Scripts
+  with a __main__ guard (benchmarks.py) can pass start_method="spawn". Without
+  the start method (fork on Windows) encoding stays in-process,
+- an optional int8 dynamic-quantized model (torch.quantization.quantize_dynamic
+  on the Linear layers), which is faster at a small cost in accuracy.
+
+Settings come from arguments or the EMBED_BATCH_SIZE, EMBED_WORKERS,
+EMBED_QUANTIZE and EMBED_CACHE environment variables (see get_embeddings).
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from embedding_cache import CachedEmbeddings
+
+EMBEDDING_MODEL = "sentence-transformers/all-mpnet-base-v2"
+EMBEDDING_DIM = 768
+BATCH_SIZE = 64
+MIN_TEXTS_PER_WORKER = 256   # smaller calls are encoded in-process
+
+_worker_model = None  # per-process model, set by _init_worker
+
+
+def load_model(model_name, quantize=False):
+    """SentenceTransformer on CPU, optionally with int8 dynamic-quantized Linear layers."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device="cpu")
+    if quantize:
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    model.eval()
+    return model
+
+
+def _init_worker(model_name, quantize, threads, ready):
+    import torch
+
+    global _worker_model
+    torch.set_num_threads(threads)
+    _worker_model = load_model(model_name, quantize)
+    ready.release()
+
+
+def _encode_slice(texts, batch_size):
+    return _worker_model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+
+
+class FastEmbeddings(Embeddings):
+    """LangChain embeddings backed by a (optionally quantized) sentence-transformers model."""
+
+    def __init__(self, model_name=EMBEDDING_MODEL, batch_size=BATCH_SIZE, workers=1, quantize=False,
+                 start_method="fork"):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.workers = max(1, workers)
+        self.quantize = quantize
+        self.start_method = start_method
+        self._model = None
+        self._pool = None
+
+    @property
+    def model_id(self):
+        """Identifies the vectors this engine produces (quantized vectors differ slightly)."""
+        return f"{self.model_name}+int8" if self.quantize else self.model_name
+
+    @property
+    def parallel(self):
+        return self.workers > 1 and self.start_method in multiprocessing.get_all_start_methods()
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = load_model(self.model_name, self.quantize)
+        return self._model
+
+    def start(self):
+        """Start the worker processes and wait until each one has loaded the model.
+
+        Runs on the first parallel encode; call it first to keep model loading
+        out of timings.
+        """
+        if self._pool is not None or not self.parallel:
+            return
+        context = multiprocessing.get_context(self.start_method)
+        ready = context.Semaphore(0)
+        # Kept for later calls, so a stream of batches loads the model once per worker
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=_init_worker,
+                                         initargs=(self.model_name, self.quantize, threads, ready))
+        launched = [self._pool.submit(os.getpid) for _ in range(self.workers)]  # launches every worker
+        loaded = 0
+        while loaded < self.workers:
+            if ready.acquire(timeout=1):
+                loaded += 1
+                continue
+            for future in launched:
+                if future.done() and future.exception() is not None:
+                    self.close()
+                    raise future.exception()
+
+    def encode(self, texts):
+        """(len(texts), dim) float32 array, computed in length-sorted batches."""
+        texts = [str(t) for t in texts]
+        if not texts:
+            return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        # Longest first: batches hold texts of similar length, and the slowest
+        # batches are handed out to the pool first.
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        ordered = [texts[i] for i in order]
+
+        workers = min(self.workers, len(texts) // MIN_TEXTS_PER_WORKER)
+        if workers > 1 and self.parallel:
+            vectors = self._encode_parallel(ordered, workers)
+        else:
+            vectors = self.model.encode(ordered, batch_size=self.batch_size,
+                                        convert_to_numpy=True, show_progress_bar=False)
+
+        result = np.empty_like(vectors, dtype=np.float32)
+        result[order] = vectors
+        return result
+
+    def _encode_parallel(self, ordered, workers):
+        # Slices are a few batches each, so workers stay busy until the end
+        step = max(1, min(self.batch_size * 4, -(-len(ordered) // workers)))
+        slices = [ordered[start:start + step] for start in range(0, len(ordered), step)]
+        self.start()
+        return np.concatenate(list(self._pool.map(_encode_slice, slices, [self.batch_size] * len(slices))))
+
+    def close(self):
+        """Stop the worker processes, if any were started."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def embed_documents(self, texts):
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text):
+        return self.encode([text])[0].tolist()
+
+
+def get_embeddings(model_name=EMBEDDING_MODEL, batch_size=None, workers=None, quantize=None, cache=None):
+    """FastEmbeddings with settings from the arguments, else from the environment.
+
+    Unless the cache is turned off (cache=False or EMBED_CACHE=0), it sits behind
+    the shared on-disk embedding cache (see embedding_cache.py).
+    """
+    engine = FastEmbeddings(
+        model_name=model_name,
+        batch_size=batch_size or int(os.getenv("EMBED_BATCH_SIZE", BATCH_SIZE)),
+        workers=workers or int(os.getenv("EMBED_WORKERS", 1)),
+        quantize=quantize if quantize is not None else os.getenv("EMBED_QUANTIZE", "0") == "1",
+    )
+    if cache is None:
+        cache = os.getenv("EMBED_CACHE", "1") != "0"
+    return CachedEmbeddings(engine) if cache else engine
@@ -5,15 +5,20 @@ import json
 import pandas as pd
 from dotenv import load_dotenv
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
-from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.schema import Document
-from langchain_pinecone import PineconeVectorStore
 from langchain_openai import ChatOpenAI
 from langchain.chains import create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.prompts import ChatPromptTemplate
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
 
+import context_packing
+from bm25_index import BM25Index
+from embedding_engine import get_embeddings
+from keyword_matcher import route_category
+from local_index import LocalVectorIndex, vector_backend
+from retrieval import RETRIEVE_K, PineconeIndex, hybrid_search, keyword_search
+
 
 
 # UTF-8 and setup
@@ -27,9 +32,18 @@ os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY", "")
 
 # Pinecone + embeddings
 print(" Connecting to Pinecone and loading embeddings...")
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
+embeddings = get_embeddings(workers=1)  # queries only: in-process, other settings from EMBED_* env vars
 index_name = "reddit-insights"
-docsearch = PineconeVectorStore.from_existing_index(index_name=index_name, embedding=embeddings)
+if vector_backend() == "local":
+    docsearch = LocalVectorIndex(embeddings)
+else:
+    from pinecone import Pinecone
+    docsearch = PineconeIndex(Pinecone(api_key=os.environ["PINECONE_API_KEY"]).Index(index_name))
+try:
+    keyword_index = BM25Index()  # same hybrid retrieval as the chatbot
+except FileNotFoundError as e:
+    print(f" {e}; evaluating vector search only.")
+    keyword_index = None
 
 
 # LLM setup
@@ -51,6 +65,7 @@ prompt = ChatPromptTemplate.from_messages([
 ])
 
 question_answer_chain = create_stuff_documents_chain(llm, prompt)
+context_packer = context_packing.from_env()  # same context packing as app.py
 
 
 # Load test questions
@@ -63,27 +78,23 @@ except FileNotFoundError:
 
 
 # Helper functions
-def get_search_filter(msg):
-    """Detect domain keywords for category filtering."""
-    if "construction" in msg.lower():
-        return {"category": "Construction"}
-    elif "law" in msg.lower() or "legal" in msg.lower():
-        return {"category": "Law"}
-    elif "tech" in msg.lower() or "software" in msg.lower():
-        return {"category": "Tech"}
-    else:
-        return None
-
 def rag_answer(question):
     """Retrieve docs and generate RAG response."""
-    search_filter = get_search_filter(question)
-    retrieved_docs_with_scores = docsearch.similarity_search_with_score(question, k=10, filter=search_filter)
-    relevant_docs = [doc for doc, score in retrieved_docs_with_scores if doc.page_content.strip()]
+    search_filter = route_category(question)  # same routing as app.py
+    keyword_hits, keyword_only = keyword_search(question, keyword_index, RETRIEVE_K, search_filter)
+    if keyword_only:  # same shortcut as app.py: no embedding, no vector search
+        query_vector, retrieved_docs_with_scores, doc_vectors = None, keyword_hits, None
+    else:
+        query_vector = embeddings.embed_query(question)
+        retrieved_docs_with_scores, doc_vectors = hybrid_search(
+            query_vector, docsearch, keyword_hits, RETRIEVE_K, search_filter)
+    relevant_docs = [doc for doc, score in retrieved_docs_with_scores]
 
     if not relevant_docs:
         return "I don’t know based on the provided Reddit data.", []
 
-    docs_for_chain = [Document(page_content=d.page_content, metadata=d.metadata or {}) for d in relevant_docs]
+    packed_docs, _ = context_packer.pack(query_vector, relevant_docs, doc_vectors)
+    docs_for_chain = [Document(page_content=d.page_content, metadata=d.metadata or {}) for d in packed_docs]
     response = question_answer_chain.invoke({"input": question, "context": docs_for_chain})
     answer = response.strip() if isinstance(response, str) else getattr(response, "content", str(response))
     return answer, relevant_docs
@@ -210,5 +221,8 @@ llm_metrics = compute_metrics(y_true, y_pred_llm)
 print("\n Evaluation complete! Saved to evaluation_results.csv")
 print(f" RAG Metrics:\nAccuracy: {rag_metrics['accuracy']:.2f}\nPrecision: {rag_metrics['precision']:.2f}\nRecall: {rag_metrics['recall']:.2f}\nF1: {rag_metrics['f1']:.2f}")
 print(f"\n LLM Metrics:\nAccuracy: {llm_metrics['accuracy']:.2f}\nPrecision: {llm_metrics['precision']:.2f}\nRecall: {llm_metrics['recall']:.2f}\nF1: {llm_metrics['f1']:.2f}")
+packing = context_packer.stats()
+print(f"\n Context packing: {packing['tokens_in']} -> {packing['tokens_out']} prompt context tokens "
+      f"over {packing['requests']} RAG calls ({packing['tokens_saved']} saved)")
 
 
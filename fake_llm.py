@@ -0,0 +1,51 @@
+"""Local stand-in for the OpenAI chat model, for offline runs and benchmarks.
+
+Selected with CHAT_LLM=fake. It answers every prompt with a fixed-length
+summary of the retrieved context and streams it word by word, waiting
+first_token_delay before the first word and token_delay between words, which
+roughly mimics gpt-3.5-turbo's latency profile.
+"""
+import time
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+FIRST_TOKEN_DELAY = 0.5
+TOKEN_DELAY = 0.02
+ANSWER_WORDS = 120
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """Chat model that streams a canned answer with configurable delays."""
+
+    first_token_delay: float = FIRST_TOKEN_DELAY
+    token_delay: float = TOKEN_DELAY
+    answer_words: int = ANSWER_WORDS
+
+    @property
+    def _llm_type(self):
+        return "fake-streaming"
+
+    def _words(self, messages):
+        # Echo a few words of the system prompt's context, padded to answer_words
+        context = messages[0].content.split("Context:", 1)[-1].split() if messages else []
+        question = messages[-1].content if messages else ""
+        words = f"Based on the Reddit excerpts about: {question}".split() + context
+        words = (words * (self.answer_words // max(len(words), 1) + 1))[:self.answer_words]
+        return [word + " " for word in words]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        text = "".join(self._words(messages))
+        time.sleep(self.first_token_delay + self.token_delay * (self.answer_words - 1))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.first_token_delay)
+        for n, word in enumerate(self._words(messages)):
+            if n:
+                time.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word))
+            if run_manager:
+                run_manager.on_llm_new_token(word, chunk=chunk)
+            yield chunk
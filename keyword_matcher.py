@@ -0,0 +1,123 @@
+"""Single-pass software keyword matching.
+
+`keywords_dict` is the domain dictionary used by data_clean.py. KeywordMatcher
+compiles it once into one regex alternation per category, so each text is scanned
+once instead of once per keyword. route_category maps a chatbot question to a
+category filter through the same keywords.
+"""
+import re
+
+
+# Structured domain-specific dictionary
+keywords_dict = {
+    "Law": {
+        "Case Management": ["clio", "filevine", "smokeball", "practicepanther"],
+        "Research": ["lexisnexis", "westlaw"],
+        "Document Mgmt": ["imanage", "everlaw", "relativity", "document automation"],
+        "Payments": ["lawpay"],
+        "Other": ["ediscovery", "contract software"]
+    },
+    "Construction": {
+        "Design": ["autocad", "revit", "bim", "sketchup", "solidworks"],
+        "Project Mgmt": ["bluebeam", "procore", "plangrid", "primavera", "project management"],
+        "Other": ["construction software", "estimating software"]
+    },
+    "Tech": {
+        "DevOps": ["jira", "docker", "kubernetes", "ansible"],
+        "Cloud": ["aws", "azure", "gcp"],
+        "Security": ["firewall", "endpoint management", "security software"],
+        "Infra": ["servicenow", "splunk", "active directory", "linux"]
+    }
+}
+
+
+class KeywordMatcher:
+    """Match every keyword of a category in one scan of the text.
+
+    The pattern is a zero-width lookahead around the alternation, so matches that
+    overlap (e.g. "a b" and "b c" in "a b c") are all reported, the same as
+    searching for each keyword on its own. Keywords contained in a longer keyword
+    are added whenever the longer one matches.
+    """
+
+    def __init__(self, keywords=keywords_dict):
+        self.patterns = {}
+        self.subcategories = {}
+        self.nested = {}
+        for category, subcats in keywords.items():
+            kws = set()
+            for subcat, kw_list in subcats.items():
+                for kw in kw_list:
+                    kw = kw.lower()
+                    kws.add(kw)
+                    self.subcategories.setdefault((category, kw), subcat)
+            ordered = sorted(kws, key=len, reverse=True)
+            alternation = "|".join(re.escape(kw) for kw in ordered)
+            self.patterns[category] = re.compile(rf"(?=\b({alternation})\b)")
+            for kw in ordered:
+                inner = [other for other in ordered
+                         if other != kw and re.search(rf"\b{re.escape(other)}\b", kw)]
+                if inner:
+                    self.nested[(category, kw)] = inner
+
+    def match(self, text, category):
+        """Keywords of `category` found in text, in order of first appearance."""
+        pattern = self.patterns.get(category)
+        if pattern is None:
+            return []
+        found = {}
+        for kw in pattern.findall(str(text).lower()):
+            found[kw] = None
+            for inner in self.nested.get((category, kw), ()):
+                found[inner] = None
+        return list(found)
+
+    def match_with_subcategories(self, text, category):
+        """(keyword, subcategory) pairs found in text."""
+        return [(kw, self.subcategories[(category, kw)]) for kw in self.match(text, category)]
+
+    def match_series(self, texts, categories):
+        """Batch API: one list of keywords per (text, category) pair of two columns."""
+        return [self.match(text, category) for text, category in zip(texts, categories)]
+
+    def subcategories_of(self, keywords, category):
+        return sorted({self.subcategories[(category, kw)] for kw in keywords})
+
+
+# Domain words checked (in this order) when a question names no tool
+CATEGORY_WORDS = {
+    "Construction": ["construction"],
+    "Law": ["law", "laws", "lawyer", "lawyers", "legal"],
+    "Tech": ["tech", "technology", "software"],
+}
+_CATEGORY_PATTERNS = {
+    category: re.compile(rf"\b({'|'.join(map(re.escape, words))})\b") for category, words in CATEGORY_WORDS.items()
+}
+_router = None
+
+
+def tool_mentions(text, matcher=None):
+    """{category: [keywords]} of the keywords_dict tools named in text."""
+    global _router
+    if matcher is None:
+        _router = _router or KeywordMatcher()
+        matcher = _router
+    found = {category: matcher.match(text, category) for category in matcher.patterns}
+    return {category: kws for category, kws in found.items() if kws}
+
+
+def route_category(question, matcher=None):
+    """Search filter for a question: {"category": ...} or None to search every category.
+
+    A tool name decides the category (procore -> Construction); tools of several
+    categories mean no filter. Otherwise whole domain words are used, so "lawpay"
+    or "flawed" no longer route to Law.
+    """
+    mentions = tool_mentions(question, matcher)
+    if mentions:
+        return {"category": next(iter(mentions))} if len(mentions) == 1 else None
+    text = str(question).lower()
+    for category, pattern in _CATEGORY_PATTERNS.items():
+        if pattern.search(text):
+            return {"category": category}
+    return None
@@ -0,0 +1,83 @@
+"""Lazily built, thread-safe app components (embedding model, vector store, chains).
+
+app.py imports in well under a second and builds each component on first use
+or from the background warm-up; /ready reports which ones are loaded. A
+component given a version function (the local indexes, with the index version
+written by store_index.py) is rebuilt when that version changes.
+"""
+import threading
+import time
+
+RETRY_SECONDS = 30   # a failed build (e.g. Pinecone unreachable) is retried after this
+
+
+class Component:
+    """A value built once by build(), on the first get() from any thread."""
+
+    def __init__(self, name, build, required=True, version=None):
+        self.name = name
+        self.build = build
+        self.required = required  # /ready waits for required components only
+        self.version = version    # rebuilt when version() differs from the one it was built at
+        self.lock = threading.Lock()
+        self.value = None
+        self.loaded = False
+        self.seconds = None
+        self.error = None
+        self._failed_at = None
+        self._built_version = None
+
+    def _current(self):
+        return self.loaded and (self.version is None or self.version() == self._built_version)
+
+    def get(self):
+        """The value, or None while the last build failed less than RETRY_SECONDS ago.
+
+        While a rebuild for a new version fails, the previous value is kept.
+        Requests wait for a rebuild instead of reading the old value, so no
+        answer from the old version is cached under the new one.
+        """
+        if self._current():
+            return self.value
+        with self.lock:
+            if self._current():
+                return self.value
+            if self._failed_at is not None and time.monotonic() - self._failed_at < RETRY_SECONDS:
+                return self.value
+            version = self.version() if self.version is not None else None  # before building: a newer one rebuilds again
+            start = time.perf_counter()
+            try:
+                value = self.build()
+            except Exception as e:
+                self.error = str(e)
+                self._failed_at = time.monotonic()
+                print(f" Could not load {self.name}: {e}")
+                return self.value
+            action = "Reloaded" if self.loaded else "Loaded"
+            self.value, self.loaded, self.error, self._failed_at = value, True, None, None
+            self._built_version = version
+            self.seconds = time.perf_counter() - start
+            print(f" {action} {self.name} in {self.seconds:.1f}s")
+            return value
+
+    def set(self, value):
+        """Use value instead of building one (benchmarks, tests)."""
+        with self.lock:
+            self.value, self.loaded, self.error = value, True, None
+            self._built_version = self.version() if self.version is not None else None
+
+    def status(self):
+        return {"loaded": self.loaded, "required": self.required, "seconds": self.seconds, "error": self.error}
+
+
+def warm_up(components, then=None):
+    """Build every component on a background thread, then call then() if given."""
+    def run():
+        for component in components:
+            component.get()
+        if then is not None:
+            then()
+
+    thread = threading.Thread(target=run, name="warm-up", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,321 @@
+"""Local IVF vector index, an offline alternative to the Pinecone index.
+
+Selected with VECTOR_BACKEND=local. store_index.py fills it and app.py /
+evaluate.py query it through the same LangChain VectorStore calls they use
+with Pinecone (similarity_search_with_score with a metadata filter).
+
+Vectors are L2-normalized and grouped by their nearest k-means centroid
+(inverted file). Indexes of up to EXACT_SCAN_ROWS rows are searched exactly
+(one matrix-vector product, a few ms for tens of thousands of chunks). Larger
+ones score the centroids, then scan only the rows of the nprobe closest lists
+(by default a quarter of the lists, at least NPROBE): faster, but some true
+neighbours are missed. If a filter leaves fewer than k candidates, more lists
+are probed, down to an exact scan. Scores are cosine similarities, like the
+Pinecone index. On disk (vector_index/<version>/):
+
+    vectors.f32   float32 rows ordered by list, loaded with np.memmap
+    ivf.npz       centroids and list offsets
+    docs.jsonl    id, text and metadata of every row, in the same order
+
+Every persist() writes a new version directory and then points vector_index/CURRENT
+at it. A running app keeps reading (and memory-mapping) the version it loaded,
+which is never replaced in place, so this works on Windows too.
+"""
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+LOCAL_INDEX_DIR = "vector_index"
+NPROBE = 8                 # fewest lists probed; by default a quarter of them
+EXACT_SCAN_ROWS = 100_000  # indexes up to this size are searched exactly
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 100_000
+ASSIGN_BATCH = 20_000
+
+
+CURRENT_FILE = "CURRENT"
+
+
+def current_version_dir(path):
+    """Directory of the live version of the index in path; path itself for the old flat layout."""
+    try:
+        with open(os.path.join(path, CURRENT_FILE), "r", encoding="utf-8") as f:
+            return os.path.join(path, f.read().strip())
+    except FileNotFoundError:
+        return path
+
+
+def new_version_dir(path):
+    """New empty directory in path for the next version of an index."""
+    version = os.path.join(path, uuid.uuid4().hex)
+    os.makedirs(version)
+    return version
+
+
+def publish_version(path, version):
+    """Make version the live version of the index in path and remove older ones.
+
+    The version it replaces is kept for readers that are still loading it.
+    Removal failures are ignored: on Windows a version that a running process
+    still maps stays until a later run.
+    """
+    previous = current_version_dir(path)
+    pointer = os.path.join(path, CURRENT_FILE)
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(os.path.basename(version))
+    os.replace(pointer + ".tmp", pointer)
+    keep = {CURRENT_FILE, os.path.basename(version), os.path.basename(previous)}
+    for name in os.listdir(path):
+        if name in keep:
+            continue
+        entry = os.path.join(path, name)
+        if os.path.isdir(entry):
+            shutil.rmtree(entry, ignore_errors=True)
+        else:
+            try:
+                os.remove(entry)  # files of the old flat layout
+            except OSError:
+                pass
+
+
+def vector_backend():
+    """"pinecone" (default) or "local", from the VECTOR_BACKEND environment variable."""
+    return os.getenv("VECTOR_BACKEND", "pinecone").lower()
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def kmeans(vectors, n_lists, iterations=KMEANS_ITERATIONS, seed=0):
+    """Spherical k-means centroids trained on a sample of the vectors."""
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), size=min(len(vectors), KMEANS_SAMPLE), replace=False)]
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        empty = np.bincount(assignment, minlength=n_lists) == 0
+        sums[empty] = centroids[empty]  # keep centroids that lost all their points
+        centroids = _normalize(sums)
+    return centroids
+
+
+def assign(vectors, centroids):
+    return np.concatenate([
+        np.argmax(vectors[start:start + ASSIGN_BATCH] @ centroids.T, axis=1)
+        for start in range(0, len(vectors), ASSIGN_BATCH)
+    ]) if len(vectors) else np.empty(0, dtype=np.int64)
+
+
+def condition_mask(column, condition):
+    """Pinecone-style filter condition: a plain value, {"$eq": v}, {"$ne": v} or {"$in": [...]}."""
+    if isinstance(condition, dict):
+        if "$in" in condition:
+            return np.isin(column, list(condition["$in"]))
+        if "$ne" in condition:
+            return column != condition["$ne"]
+        condition = condition.get("$eq")
+    return column == condition
+
+
+class LocalVectorIndex(VectorStore):
+    """In-process IVF index with the VectorStore interface used by app.py and evaluate.py.
+
+    add_texts/delete change the index in memory; persist() rebuilds the
+    inverted lists and writes them to disk.
+    """
+
+    def __init__(self, embedding=None, path=LOCAL_INDEX_DIR, nprobe=None, exact_scan_rows=EXACT_SCAN_ROWS):
+        self.embedding = embedding
+        self.path = path
+        self.nprobe = nprobe
+        self.exact_scan_rows = exact_scan_rows
+        self._load()
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    # --------- STORAGE ----------
+    def _file(self, name):
+        return os.path.join(self.version, name)
+
+    def _load(self):
+        self.version = current_version_dir(self.path)
+        self.ids, self.texts, self.metadatas = [], [], []
+        self.vectors = np.empty((0, 0), dtype=np.float32)
+        self.centroids = np.empty((0, 0), dtype=np.float32)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self._columns = {}
+        self._rows_by_id = None
+        self._pending = []
+        if not os.path.exists(self._file("ivf.npz")):
+            return
+        with np.load(self._file("ivf.npz")) as ivf:  # closed again, so old versions can be removed
+            self.centroids, self.offsets, dim = ivf["centroids"], ivf["offsets"], int(ivf["dim"])
+        with open(self._file("docs.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                doc = json.loads(line)
+                self.ids.append(doc["id"])
+                self.texts.append(doc["text"])
+                self.metadatas.append(doc["metadata"])
+        if self.ids:
+            self.vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r",
+                                     shape=(len(self.ids), dim))
+
+    def __len__(self):
+        return len(self.ids) + len(self._pending)
+
+    def _column(self, key):
+        if key not in self._columns:
+            self._columns[key] = np.array([m.get(key) for m in self.metadatas], dtype=object)
+        return self._columns[key]
+
+    def vectors_for_ids(self, ids):
+        """Stored (normalized) vectors of ids, None for ids not in the persisted index."""
+        if self._rows_by_id is None:
+            self._rows_by_id = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        rows = [self._rows_by_id.get(doc_id) for doc_id in ids]
+        return [np.asarray(self.vectors[row]) if row is not None else None for row in rows]
+
+    # --------- WRITES ----------
+    def add_vectors(self, vectors, texts, metadatas=None, ids=None):
+        vectors = _normalize(vectors)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(len(self) + i) for i in range(len(texts))]
+        self._pending.extend(zip(ids, texts, metadatas, vectors))
+        return list(ids)
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        return self.add_vectors(self.embedding.embed_documents(texts), texts, metadatas, ids)
+
+    def delete(self, ids=None, delete_all=None, **kwargs):
+        if delete_all:
+            keep = np.zeros(len(self.ids), dtype=bool)
+            self._pending = []
+        else:
+            drop = set(ids or [])
+            keep = np.array([i not in drop for i in self.ids], dtype=bool)
+            self._pending = [p for p in self._pending if p[0] not in drop]
+        rows = np.flatnonzero(keep)
+        self.vectors = np.asarray(self.vectors[rows]) if len(rows) else np.empty((0, self.vectors.shape[1]), np.float32)
+        self.ids = [self.ids[r] for r in rows]
+        self.texts = [self.texts[r] for r in rows]
+        self.metadatas = [self.metadatas[r] for r in rows]
+        self.centroids = np.empty((0, 0), dtype=np.float32)  # lists are rebuilt by persist()
+        self._columns = {}
+        self._rows_by_id = None
+        return True
+
+    def persist(self, n_lists=None):
+        """Merge pending additions (replacing rows with the same id), rebuild the lists and save."""
+        if self._pending:
+            pending, self._pending = self._pending, []
+            replaced = {p[0] for p in pending} & set(self.ids)
+            if replaced:
+                self.delete(ids=replaced)
+            added = np.stack([p[3] for p in pending])
+            self.vectors = np.concatenate([np.asarray(self.vectors), added]) if len(self.ids) else added
+            self.ids += [p[0] for p in pending]
+            self.texts += [p[1] for p in pending]
+            self.metadatas += [p[2] for p in pending]
+
+        vectors = np.asarray(self.vectors, dtype=np.float32)
+        n_lists = n_lists or max(1, int(np.sqrt(len(vectors))))
+        centroids = kmeans(vectors, min(n_lists, len(vectors))) if len(vectors) else np.empty((0, 0), np.float32)
+        lists = assign(vectors, centroids)
+        order = np.argsort(lists, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(lists, minlength=len(centroids)))])
+
+        version = new_version_dir(self.path)
+        vectors[order].tofile(os.path.join(version, "vectors.f32"))
+        np.savez(os.path.join(version, "ivf.npz"), centroids=centroids, offsets=offsets,
+                 dim=vectors.shape[1] if vectors.ndim == 2 else 0)
+        with open(os.path.join(version, "docs.jsonl"), "w", encoding="utf-8") as f:
+            for row in order:
+                f.write(json.dumps({"id": self.ids[row], "text": self.texts[row],
+                                    "metadata": self.metadatas[row]}, default=str) + "\n")
+        publish_version(self.path, version)
+        self._load()
+
+    # --------- SEARCH ----------
+    def _filter_mask(self, rows, filter):
+        mask = np.ones(len(rows), dtype=bool)
+        for key, condition in (filter or {}).items():
+            mask &= condition_mask(self._column(key)[rows], condition)
+        return mask
+
+    def search_vector(self, vector, k=4, filter=None, nprobe=None, exact=False):
+        """(rows, cosine scores) of the k nearest rows passing the filter."""
+        if not len(self.ids):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = _normalize(vector)
+        n_lists = len(self.centroids)
+        nprobe = nprobe or self.nprobe
+        exact = exact or (not nprobe and len(self.ids) <= self.exact_scan_rows)
+        probe = n_lists if exact else min(nprobe or max(NPROBE, n_lists // 4), n_lists)
+        list_order = np.argsort(-(self.centroids @ query))
+        while True:
+            lists = list_order[:probe]
+            rows = np.concatenate([np.arange(self.offsets[l], self.offsets[l + 1]) for l in lists])
+            keep = self._filter_mask(rows, filter) if filter else None
+            if (len(rows) if keep is None else keep.sum()) >= k or probe >= n_lists:
+                break
+            probe = min(probe * 2, n_lists)  # a selective filter: widen the search
+        vectors = np.asarray(self.vectors)
+        if probe >= n_lists:
+            scores = (vectors @ query)[rows]
+        else:
+            # Lists are contiguous row ranges: score them in place instead of gathering a copy
+            scores = np.concatenate([vectors[self.offsets[l]:self.offsets[l + 1]] @ query for l in lists])
+        if keep is not None:
+            rows, scores = rows[keep], scores[keep]
+        top = np.argsort(-scores)[:k] if len(scores) <= k else np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return rows[top], scores[top]
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        rows, scores = self.search_vector(embedding, k, filter)
+        return [
+            (Document(page_content=self.texts[r], metadata=self.metadatas[r], id=self.ids[r]), float(s))
+            for r, s in zip(rows, scores)
+        ]
+
+    def similarity_search_with_vectors(self, embedding, k=4, filter=None):
+        """[(Document, score, stored vector)], for callers that reuse the vectors (context packing)."""
+        rows, scores = self.search_vector(embedding, k, filter)
+        return [
+            (Document(page_content=self.texts[r], metadata=self.metadatas[r], id=self.ids[r]), float(s),
+             np.asarray(self.vectors[r]))
+            for r, s in zip(rows, scores)
+        ]
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None, **kwargs):
+        """Same as similarity_search_with_score_by_vector, under PineconeVectorStore's name."""
+        return self.similarity_search_with_score_by_vector(embedding, k, filter)
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, filter)
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score  # already a cosine similarity
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, path=LOCAL_INDEX_DIR, **kwargs):
+        index = cls(embedding, path)
+        index.add_texts(texts, metadatas, ids)
+        index.persist()
+        return index
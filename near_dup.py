@@ -0,0 +1,130 @@
+"""Near-duplicate detection with MinHash signatures and LSH banding.
+
+Cross-posts, quoted replies and bot boilerplate are nearly identical texts that
+would each be embedded and stored. Every text gets a MinHash signature over its
+word shingles. Signatures are cut into bands, and only texts that share a band
+bucket are compared, so the cost grows with the number of texts rather than the
+number of pairs.
+"""
+import numpy as np
+import pandas as pd
+
+NUM_PERM = 128
+SHINGLE_SIZE = 3              # words per shingle
+EMPTY = np.iinfo(np.uint64).max
+MAX_TOKENS_PER_BATCH = 200_000
+
+# Odd 64-bit constants for mixing word hashes into shingle hashes
+_MIX = np.array([0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93,
+                 0xFF51AFD7ED558CCD, 0xC4CEB9FE1A85EC53], dtype=np.uint64)
+
+
+def _batch_signatures(words, lengths, a, b, shingle_size):
+    """Signatures for a batch of texts given as one flat list of their words."""
+    tokens = pd.util.hash_array(np.array(words, dtype=object))
+    ends = np.repeat(np.cumsum(lengths), lengths)
+    padded = np.concatenate([tokens, np.zeros(shingle_size, dtype=np.uint64)])
+    positions = np.arange(len(tokens))
+
+    # Shingle starting at every position; words past the end of its text count as 0
+    shingles = np.zeros(len(tokens), dtype=np.uint64)
+    for j in range(shingle_size):
+        word = np.where(positions + j < ends, padded[j:j + len(tokens)], np.uint64(0))
+        shingles += word * _MIX[j % len(_MIX)]
+
+    # Keep starts that fit inside their text (texts shorter than a shingle keep one)
+    starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    valid = (positions + shingle_size <= ends) | (positions == starts)
+    shingles = shingles[valid] >> np.uint64(32)
+    counts = np.maximum(lengths - shingle_size + 1, 1)
+
+    # Multiply-shift hashing stands in for random permutations
+    permuted = a[:, None] * shingles[None, :]
+    permuted += b[:, None]
+    permuted >>= np.uint64(32)
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    return np.minimum.reduceat(permuted, offsets, axis=1).T
+
+
+def minhash_signatures(texts, num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE, seed=1):
+    """(len(texts), num_perm) uint64 signatures over word shingles; rows for empty texts are EMPTY."""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)
+    signatures = np.full((len(texts), num_perm), EMPTY, dtype=np.uint64)
+
+    rows, words, lengths = [], [], []
+    def flush():
+        signatures[rows] = _batch_signatures(words, np.array(lengths), a, b, shingle_size)
+        rows.clear()
+        words.clear()
+        lengths.clear()
+
+    for i, text in enumerate(texts):
+        tokens = str(text).split()
+        if not tokens:
+            continue
+        rows.append(i)
+        words.extend(tokens)
+        lengths.append(len(tokens))
+        if len(words) >= MAX_TOKENS_PER_BATCH:
+            flush()
+    if rows:
+        flush()
+    return signatures
+
+
+def lsh_params(threshold, num_perm=NUM_PERM):
+    """Bands and rows per band whose S-curve midpoint is closest to threshold."""
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        midpoint = (1 / bands) ** (1 / rows)
+        if best is None or abs(midpoint - threshold) < abs(best[2] - threshold):
+            best = (bands, rows, midpoint)
+    return best[0], best[1]
+
+
+def near_duplicate_mask(texts, threshold=0.8, num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE):
+    """True for every text that near-duplicates a later text.
+
+    Texts whose estimated Jaccard similarity is >= threshold are grouped, and the
+    last text of each group is kept (like drop_duplicates(keep="last")). Bucket
+    members are checked against one member of the bucket rather than pairwise,
+    which keeps boilerplate buckets with thousands of texts linear.
+    """
+    texts = list(texts)
+    n = len(texts)
+    if n < 2:
+        return np.zeros(n, dtype=bool)
+    signatures = minhash_signatures(texts, num_perm, shingle_size)
+    empty = signatures[:, 0] == EMPTY
+    bands, rows = lsh_params(threshold, num_perm)
+
+    parent = np.arange(n)
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(bands):
+        chunk = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        keys = chunk.view(np.dtype((np.void, chunk.dtype.itemsize * rows))).ravel()
+        _, bucket, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        shared = np.flatnonzero((counts[bucket] > 1) & ~empty)
+        if not len(shared):
+            continue
+        order = shared[np.argsort(bucket[shared], kind="stable")]
+        starts = np.flatnonzero(np.r_[True, np.diff(bucket[order]) != 0])
+        for members in np.split(order, starts[1:]):
+            anchor = members[-1]
+            similarity = (signatures[members[:-1]] == signatures[anchor]).mean(axis=1)
+            for member in members[:-1][similarity >= threshold]:
+                ra, rb = find(member), find(anchor)
+                if ra != rb:
+                    # The later row becomes the root, so it is the one kept
+                    parent[min(ra, rb)] = max(ra, rb)
+
+    roots = np.array([find(i) for i in range(n)])
+    return roots != np.arange(n)
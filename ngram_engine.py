@@ -0,0 +1,146 @@
+"""Sparse n-gram counting for the pain-point analysis in data_sentiment.py.
+
+Negative rows are turned into one sparse document-term matrix of unigrams and
+bigrams with a regex tokenizer run over whole batches, so no per-row token lists
+are kept. Counts per
+category, subreddit or matched keyword are a single sparse product of a group
+indicator matrix with that document-term matrix.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+NON_TOKEN_PATTERN = re.compile(r"[^a-z\n ]")   # clean_text is already lowercase letters and spaces
+TOP_K = 20
+BATCH_SIZE = 100_000
+
+
+def _batch_entries(texts, stop_words, vocab):
+    """(doc, column) of every unigram and bigram occurrence in a batch of texts."""
+    blob = "\n".join(str(t).lower().replace("\n", " ") for t in texts) + "\n"
+    # Tokens are runs of a-z; "\n" stays a token of its own to mark the end of a doc
+    blob = NON_TOKEN_PATTERN.sub(" ", blob).replace("\n", " \n ")
+    codes, words = pd.factorize(np.array(blob.split(" "), dtype=object))
+
+    # Everything below works on integer codes; strings are only looked at per distinct word
+    is_boundary = (words == "\n")[codes]
+    docs = np.cumsum(is_boundary)
+    dropped = pd.Index(words).isin(stop_words) | (words == "") | (words == "\n")
+    keep = ~dropped[codes]
+    codes, docs = codes[keep], docs[keep]
+
+    word_columns = np.full(len(words), -1, dtype=np.int64)
+    for i in np.flatnonzero(~dropped):
+        word_columns[i] = vocab.setdefault(words[i], len(vocab))
+    # Bigrams are adjacent tokens of the same doc after stop words are dropped
+    same_doc = docs[1:] == docs[:-1]
+    pair_keys = codes[:-1][same_doc].astype(np.int64) * len(words) + codes[1:][same_doc]
+    pair_codes, pairs = pd.factorize(pair_keys)
+    pair_columns = np.array(
+        [vocab.setdefault(f"{words[k // len(words)]} {words[k % len(words)]}", len(vocab)) for k in pairs],
+        dtype=np.int64,
+    )
+    rows = np.concatenate([docs, docs[:-1][same_doc]])
+    columns = np.concatenate([word_columns[codes], pair_columns[pair_codes]])
+    return rows, columns
+
+
+def document_term_matrix(texts, stop_words, batch_size=BATCH_SIZE):
+    """(docs x ngrams) counts of unigrams and bigrams, stop words removed first.
+
+    Like the old word_tokenize + bigrams code, bigrams are formed from adjacent
+    tokens after stop words are dropped. Each batch of texts is tokenized as one
+    string and counted with array operations, so no per-row token lists are built.
+    """
+    texts = list(texts)
+    stop_words = pd.Index(sorted(stop_words))
+    vocab = {}
+    rows, columns = [], []
+    for start in range(0, len(texts), batch_size):
+        batch_rows, batch_columns = _batch_entries(texts[start:start + batch_size], stop_words, vocab)
+        rows.append(batch_rows + start)
+        columns.append(batch_columns)
+    rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    columns = np.concatenate(columns) if columns else np.empty(0, dtype=np.int64)
+    X = sparse.coo_matrix(
+        (np.ones(len(rows), dtype=np.int64), (rows, columns)), shape=(len(texts), len(vocab))
+    ).tocsr()  # duplicate entries are summed
+    return X, np.array(list(vocab), dtype=object)
+
+
+def group_indicator(labels):
+    """(groups x docs) 0/1 matrix and group names; labels are one value or a list per doc."""
+    labels = pd.Series(list(labels), dtype=object)
+    n_docs = len(labels)
+    labels = labels.explode().dropna()
+    codes, groups = pd.factorize(labels.astype(str))
+    matrix = sparse.csr_matrix(
+        (np.ones(len(codes), dtype=np.int64), (codes, labels.index.to_numpy())),
+        shape=(len(groups), n_docs),
+    )
+    return matrix, groups
+
+
+def _is_bigram(vocab):
+    return np.array([" " in ngram for ngram in vocab], dtype=bool)
+
+
+def _top_of_row(counts, columns, k):
+    if len(counts) > k:
+        keep = np.argpartition(-counts, k - 1)[:k]
+        counts, columns = counts[keep], columns[keep]
+    order = np.lexsort((columns, -counts))
+    return counts[order], columns[order]
+
+
+def top_ngrams(X, vocab, k=TOP_K):
+    """Top k unigrams and bigrams over all documents, as [(ngram, count)] lists."""
+    totals = np.asarray(X.sum(axis=0)).ravel()
+    is_bigram = _is_bigram(vocab)
+    result = {}
+    for n, mask in ((1, ~is_bigram), (2, is_bigram)):
+        columns = np.flatnonzero(mask & (totals > 0))
+        counts, columns = _top_of_row(totals[columns], columns, k)
+        result[n] = [(vocab[c], int(v)) for c, v in zip(columns, counts)]
+    return result[1], result[2]
+
+
+def top_ngrams_by(X, vocab, labels, k=TOP_K):
+    """Top k unigrams and bigrams of every group, as a long DataFrame.
+
+    Columns: group, n (1 or 2), ngram, count, rank.
+    """
+    indicator, groups = group_indicator(labels)
+    grouped = (indicator @ X).tocsr()
+    is_bigram = _is_bigram(vocab)
+
+    records = []
+    for g, group in enumerate(groups):
+        start, end = grouped.indptr[g], grouped.indptr[g + 1]
+        columns, counts = grouped.indices[start:end], grouped.data[start:end]
+        for n, bigram in ((1, False), (2, True)):
+            mask = is_bigram[columns] == bigram
+            top_counts, top_columns = _top_of_row(counts[mask], columns[mask], k)
+            records.extend(
+                (group, n, vocab[c], int(v), rank)
+                for rank, (c, v) in enumerate(zip(top_columns, top_counts), start=1)
+            )
+    return pd.DataFrame(records, columns=["group", "n", "ngram", "count", "rank"])
+
+
+def pain_point_table(df_negative, stop_words, k=TOP_K):
+    """Top n-grams of negative rows grouped by category, subreddit and matched keyword.
+
+    df_negative needs clean_text, category, subreddit and keywords_found (lists).
+    Also returns the overall top unigrams and bigrams.
+    """
+    X, vocab = document_term_matrix(df_negative["clean_text"].astype(str).tolist(), stop_words)
+    tables = []
+    for column in ["category", "subreddit", "keywords_found"]:
+        table = top_ngrams_by(X, vocab, df_negative[column].tolist(), k)
+        table.insert(0, "group_by", "keyword" if column == "keywords_found" else column)
+        tables.append(table)
+    unigram_counts, bigram_counts = top_ngrams(X, vocab, k)
+    return pd.concat(tables, ignore_index=True), unigram_counts, bigram_counts
@@ -0,0 +1,158 @@
+"""SQLite store of n-gram counts per (category, subreddit, sentiment, ngram).
+
+data_sentiment.py syncs it with reddit_data_sentiment.csv after every run: rows
+that are new or changed add their n-gram counts, and rows that changed or went
+away subtract the counts they added before (their text is kept for that). Counts
+are also rolled up over all subreddits and/or all categories (stored under ALL),
+so a top-k query for any filter is a single index range scan, which the Flask
+app serves from /painpoints.
+"""
+import hashlib
+import json
+import sqlite3
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from ngram_engine import document_term_matrix
+
+NGRAM_DB_PATH = "ngram_counts.db"
+ALL = "*"
+KEY_COLUMNS = ["category", "subreddit", "sentiment"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ngram_counts (
+    category TEXT,
+    subreddit TEXT,
+    sentiment TEXT,
+    ngram TEXT,
+    n INTEGER,
+    count INTEGER,
+    PRIMARY KEY (category, subreddit, sentiment, ngram)
+);
+CREATE INDEX IF NOT EXISTS idx_ngram_counts_top
+    ON ngram_counts (category, subreddit, sentiment, n, count DESC);
+CREATE TABLE IF NOT EXISTS counted_rows (
+    id TEXT PRIMARY KEY,
+    row_hash INTEGER,
+    category TEXT,
+    subreddit TEXT,
+    sentiment TEXT,
+    clean_text TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+UPSERT_SQL = (
+    "INSERT INTO ngram_counts (category, subreddit, sentiment, ngram, n, count) "
+    "VALUES (?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(category, subreddit, sentiment, ngram) DO UPDATE SET count = count + excluded.count"
+)
+
+
+def stop_words_fingerprint(stop_words):
+    return hashlib.sha256(json.dumps(sorted(stop_words)).encode("utf-8")).hexdigest()
+
+
+def row_hashes(frame):
+    """Stable hash of the columns that decide a row's counts, as signed ints SQLite can store."""
+    return pd.util.hash_pandas_object(frame[KEY_COLUMNS + ["clean_text"]], index=False).to_numpy().view(np.int64)
+
+
+class NgramStore:
+    """Mergeable n-gram counts with top-k queries."""
+
+    def __init__(self, path=NGRAM_DB_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _meta(self, name):
+        row = self.conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _delta_records(self, rows, stop_words, sign):
+        """(category, subreddit, sentiment, ngram, n, ±count) for rows and their rollups."""
+        if rows.empty:
+            return []
+        X, vocab = document_term_matrix(rows["clean_text"].astype(str).tolist(), stop_words)
+        is_bigram = np.array([" " in ngram for ngram in vocab], dtype=bool)
+        frames = []
+        for category_level, subreddit_level in [(True, True), (True, False), (False, True), (False, False)]:
+            keys = rows[KEY_COLUMNS].astype(str).reset_index(drop=True)
+            if not category_level:
+                keys["category"] = ALL
+            if not subreddit_level:
+                keys["subreddit"] = ALL
+            group_ids, groups = pd.factorize(pd.MultiIndex.from_frame(keys))
+            indicator = sparse.csr_matrix(
+                (np.ones(len(rows), dtype=np.int64), (group_ids, np.arange(len(rows)))),
+                shape=(len(groups), len(rows)),
+            )
+            counts = (indicator @ X).tocoo()
+            frame = pd.DataFrame({
+                column: groups.get_level_values(level).to_numpy()[counts.row]
+                for level, column in enumerate(KEY_COLUMNS)
+            })
+            frame["ngram"] = vocab[counts.col]
+            frame["n"] = np.where(is_bigram[counts.col], 2, 1)
+            frame["count"] = sign * counts.data.astype(np.int64)
+            frames.append(frame)
+        return list(pd.concat(frames).astype(object).itertuples(index=False, name=None))
+
+    def sync(self, df, stop_words):
+        """Bring the counts in line with df (id, category, subreddit, sentiment, clean_text).
+
+        Returns (added, removed) row counts; an edited row counts as both. A
+        different stop-word list rebuilds the counts from scratch.
+        """
+        df = df.drop_duplicates(subset=["id"], keep="last").copy()
+        df["id"] = df["id"].astype(str)
+        df["row_hash"] = row_hashes(df)
+        fingerprint = stop_words_fingerprint(stop_words)
+
+        with self.conn:
+            if self._meta("stop_words") != fingerprint:
+                self.conn.execute("DELETE FROM ngram_counts")
+                self.conn.execute("DELETE FROM counted_rows")
+                self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('stop_words', ?)",
+                                  (fingerprint,))
+            counted = pd.read_sql_query(
+                "SELECT id, row_hash, category, subreddit, sentiment, clean_text FROM counted_rows", self.conn
+            )
+            current = dict(zip(df["id"], df["row_hash"]))
+            before = dict(zip(counted["id"], counted["row_hash"]))
+            stale = counted[np.array([current.get(i) != h for i, h in zip(counted["id"], counted["row_hash"])],
+                                     dtype=bool)]
+            fresh = df[np.array([before.get(i) != h for i, h in zip(df["id"], df["row_hash"])], dtype=bool)]
+
+            records = (self._delta_records(stale, stop_words, -1)
+                       + self._delta_records(fresh, stop_words, +1))
+            self.conn.executemany(UPSERT_SQL, records)
+            self.conn.execute("DELETE FROM ngram_counts WHERE count <= 0")
+
+            self.conn.executemany("DELETE FROM counted_rows WHERE id = ?", ((i,) for i in stale["id"]))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO counted_rows (id, row_hash, category, subreddit, sentiment, clean_text) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                fresh[["id", "row_hash"] + KEY_COLUMNS + ["clean_text"]]
+                .astype(object).itertuples(index=False, name=None),
+            )
+        return len(fresh), len(stale)
+
+    def top(self, n=1, k=20, sentiment="negative", category=None, subreddit=None):
+        """Top k n-grams as [(ngram, count)]; None for category/subreddit means all of them."""
+        rows = self.conn.execute(
+            "SELECT ngram, count FROM ngram_counts "
+            "WHERE category = ? AND subreddit = ? AND sentiment = ? AND n = ? "
+            "ORDER BY count DESC, ngram LIMIT ?",
+            (category or ALL, subreddit or ALL, sentiment, n, k),
+        )
+        return rows.fetchall()
@@ -0,0 +1,154 @@
+"""Headless rendering of the pipeline charts into static/plots/.
+
+The pipeline scripts only aggregate the (small) data behind each chart. Charts
+whose data changed since their last render are drawn with the non-interactive Agg
+backend in a detached background process, so the next pipeline step can start
+right away:
+
+    python plots.py static/plots/pending-<id>.json
+"""
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import uuid
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import pandas as pd
+import seaborn as sns
+
+PLOTS_DIR = os.path.join("static", "plots")
+FINGERPRINT_DIR = os.path.join(PLOTS_DIR, ".fingerprints")
+RENDER_LOG = "plot_render_log.txt"
+
+
+# --------- CHART SPECS ----------
+def chart(name, kind, labels, values, title, xlabel="", ylabel="", palette=None, figsize=(8, 5)):
+    return {
+        "name": name, "kind": kind,
+        "labels": [str(label) for label in labels], "values": [float(v) for v in values],
+        "title": title, "xlabel": xlabel, "ylabel": ylabel,
+        "palette": palette, "figsize": list(figsize),
+    }
+
+
+def eda_charts(df_clean):
+    """Charts for data_clean.py: mentions by category, top tools, top subreddits, trend."""
+    by_category = df_clean["category"].value_counts()
+    top_keywords = df_clean["keywords_found"].explode().value_counts().head(10)
+    top_subs = df_clean["subreddit"].value_counts().head(10)
+    created = pd.to_datetime(df_clean["created_utc"], errors="coerce")
+    trend = df_clean.groupby(created.dt.date).size()
+    return [
+        chart("category_mentions", "bar", by_category.index, by_category.values,
+              "Software Mentions by Category", "Category", "Count of Mentions", "Set2", (6, 4)),
+        chart("top_tools", "barh", top_keywords.index, top_keywords.values,
+              "Top 10 Most Mentioned Tools/Software", "Number of Mentions", "Software/Tool", "viridis"),
+        chart("top_subreddits", "barh", top_subs.index, top_subs.values,
+              "Top 10 Subreddits with Software Mentions", "Number of Mentions", "Subreddit", "mako"),
+        chart("mention_trend", "line", trend.index, trend.values,
+              "Trend of Software Mentions Over Time", "Date", "Number of Mentions", figsize=(10, 5)),
+    ]
+
+
+def sentiment_charts(df_final, unigram_counts=(), bigram_counts=()):
+    """Charts for data_sentiment.py: sentiment distribution and negative-mention n-grams."""
+    counts = df_final["sentiment"].value_counts()
+    specs = [chart("sentiment", "pie", counts.index, counts.values, "Sentiment Distribution", figsize=(6, 6))]
+    if len(unigram_counts):
+        words, values = zip(*unigram_counts)
+        specs.append(chart("unigrams", "barh", words, values, "Top Words in Negative Mentions",
+                           "Count", "Word", "rocket"))
+    if len(bigram_counts):
+        phrases, values = zip(*bigram_counts)
+        specs.append(chart("bigrams", "barh", phrases, values,
+                           "Top Bigrams in Negative Mentions", "Count", "Bigram", "flare"))
+    return specs
+
+
+# --------- CHANGE DETECTION ----------
+def fingerprint(spec):
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _fingerprint_path(name):
+    return os.path.join(FINGERPRINT_DIR, name)
+
+
+def is_current(spec):
+    png = os.path.join(PLOTS_DIR, f"{spec['name']}.png")
+    path = _fingerprint_path(spec["name"])
+    if not (os.path.exists(png) and os.path.exists(path)):
+        return False
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip() == fingerprint(spec)
+
+
+# --------- RENDERING ----------
+def draw(spec):
+    """Render one chart spec to static/plots/<name>.png."""
+    fig, ax = plt.subplots(figsize=spec["figsize"])
+    labels, values = spec["labels"], spec["values"]
+    if spec["kind"] == "bar":
+        sns.barplot(x=labels, y=values, hue=labels, palette=spec["palette"], legend=False, ax=ax)
+    elif spec["kind"] == "barh":
+        sns.barplot(x=values, y=labels, hue=labels, palette=spec["palette"], legend=False, ax=ax)
+    elif spec["kind"] == "line":
+        ax.plot(pd.to_datetime(labels), values, marker="o")
+        ax.grid(True)
+        fig.autofmt_xdate()
+    elif spec["kind"] == "pie":
+        ax.pie(values, labels=labels, autopct="%1.2f%%")
+    ax.set_title(spec["title"])
+    ax.set_xlabel(spec["xlabel"])
+    ax.set_ylabel(spec["ylabel"])
+    fig.tight_layout()
+    fig.savefig(os.path.join(PLOTS_DIR, f"{spec['name']}.png"), dpi=100)
+    plt.close(fig)
+
+    with open(_fingerprint_path(spec["name"]), "w", encoding="utf-8") as f:
+        f.write(fingerprint(spec))
+
+
+def render_charts(specs, background=True):
+    """Render the charts whose data changed, by default in a detached process."""
+    os.makedirs(FINGERPRINT_DIR, exist_ok=True)
+    changed = [spec for spec in specs if not is_current(spec)]
+    skipped = len(specs) - len(changed)
+    if not changed:
+        print(f" Charts unchanged, skipped {skipped} renders.")
+        return None
+    if not background:
+        for spec in changed:
+            draw(spec)
+        return None
+
+    spec_path = os.path.join(PLOTS_DIR, f"pending-{uuid.uuid4().hex}.json")
+    with open(spec_path, "w", encoding="utf-8") as f:
+        json.dump(changed, f)
+    # Output goes to a log file, not our stdout: app.py streams this step's stdout
+    # until it closes, which would otherwise wait for the renderer too.
+    with open(RENDER_LOG, "a", encoding="utf-8") as log:
+        process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), spec_path],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    print(f" Rendering {len(changed)} charts to {PLOTS_DIR} in the background "
+          f"(pid {process.pid}, {skipped} unchanged).")
+    return process
+
+
+if __name__ == "__main__":
+    spec_path = sys.argv[1]
+    with open(spec_path, "r", encoding="utf-8") as f:
+        pending = json.load(f)
+    try:
+        for spec in pending:
+            draw(spec)
+            print(f"Rendered {spec['name']}.png")
+    finally:
+        os.remove(spec_path)
@@ -0,0 +1,245 @@
+"""Two-tier answer cache for the /get chatbot endpoint.
+
+1. Exact tier: LRU with a TTL, keyed by the normalized question and the
+   category filter. A hit costs a dict lookup.
+2. Semantic tier: the same entries, matched by the cosine distance between the
+   new question's embedding and the cached questions' embeddings (same filter
+   only). A hit skips retrieval and the LLM call.
+
+store_index.py writes a new version to index_version.txt whenever it changes
+the index; the cache notices on the next lookup and drops every entry.
+
+InFlight coalesces identical questions that arrive while one is being answered,
+so concurrent duplicates share one retrieval and one LLM call.
+"""
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+INDEX_VERSION_PATH = "index_version.txt"
+MAX_ENTRIES = 1024
+TTL_SECONDS = 3600
+MAX_DISTANCE = 0.05   # cosine distance for a semantic hit
+
+_SPACES = re.compile(r"\s+")
+_TRAILING = re.compile(r"[\s?!.]+$")
+
+
+def bump_index_version(path=INDEX_VERSION_PATH):
+    """Record that the vector index changed (called by store_index.py)."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(uuid.uuid4().hex)
+
+
+def read_index_version(path=INDEX_VERSION_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def normalize_question(question):
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return _TRAILING.sub("", _SPACES.sub(" ", str(question).lower()).strip())
+
+
+def filter_key(search_filter):
+    return json.dumps(search_filter or {}, sort_keys=True)
+
+
+def question_key(question, search_filter=None):
+    """Questions with the same key get the same answer."""
+    return normalize_question(question), filter_key(search_filter)
+
+
+class QueryCache:
+    """Thread-safe exact + semantic answer cache with hit/miss counters."""
+
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS, max_distance=MAX_DISTANCE,
+                 version_path=INDEX_VERSION_PATH):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.version_path = version_path
+        self.lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._version = read_index_version(version_path)
+        self._clear()
+
+    def _clear(self):
+        # key -> (answer, expires, slot); slots index the semantic matrix
+        self._entries = OrderedDict()
+        self._vectors = None
+        self._slot_keys = [None] * self.max_entries
+        self._slot_filters = np.full(self.max_entries, None, dtype=object)
+        self._free = list(range(self.max_entries - 1, -1, -1))
+
+    def _check_version(self):
+        version = read_index_version(self.version_path)
+        if version != self._version:
+            self._version = version
+            self._clear()
+            self.invalidations += 1
+
+    def _drop(self, key):
+        _, _, slot = self._entries.pop(key)
+        if slot is not None:
+            self._slot_keys[slot] = None
+            self._slot_filters[slot] = None
+            self._free.append(slot)
+
+    # --------- LOOKUPS ----------
+    def get_exact(self, question, search_filter=None):
+        """Answer from the exact tier, or None. Checked before embedding the question;
+        misses are counted by the get() that follows."""
+        key = question_key(question, search_filter)
+        with self.lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry[0]
+
+    def get(self, question, search_filter=None, vector=None):
+        """(answer, tier) with tier "exact" or "semantic", or (None, None) on a miss."""
+        key = question_key(question, search_filter)
+        now = time.monotonic()
+        with self.lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry[0], "exact"
+            if entry is not None:
+                self._drop(key)
+
+            match = self._nearest(key[1], vector, now) if vector is not None else None
+            if match is not None:
+                self._entries.move_to_end(match)
+                self.semantic_hits += 1
+                return self._entries[match][0], "semantic"
+            self.misses += 1
+            return None, None
+
+    def _nearest(self, fkey, vector, now):
+        if self._vectors is None or not self._entries:
+            return None
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        similarity = self._vectors @ query
+        similarity[self._slot_filters != fkey] = -np.inf
+        slot = int(np.argmax(similarity))
+        if 1.0 - similarity[slot] > self.max_distance:
+            return None
+        key = self._slot_keys[slot]
+        if self._entries[key][1] <= now:
+            self._drop(key)
+            return None
+        return key
+
+    # --------- WRITES ----------
+    def put(self, question, search_filter, answer, vector=None):
+        if self.max_entries <= 0:  # QUERY_CACHE_SIZE=0 turns the cache off
+            return
+        key = question_key(question, search_filter)
+        with self.lock:
+            self._check_version()
+            if key in self._entries:
+                self._drop(key)
+            while len(self._entries) >= self.max_entries:
+                self._drop(next(iter(self._entries)))  # least recently used
+
+            slot = None
+            if vector is not None:
+                vector = np.asarray(vector, dtype=np.float32)
+                if self._vectors is None:
+                    self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+                slot = self._free.pop()
+                self._vectors[slot] = vector / max(float(np.linalg.norm(vector)), 1e-12)
+                self._slot_keys[slot] = key
+                self._slot_filters[slot] = key[1]
+            self._entries[key] = (answer, time.monotonic() + self.ttl, slot)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "index_version": self._version,
+            }
+
+
+class InFlight:
+    """Futures of questions being answered, shared by identical concurrent requests."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._futures = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def join(self, key):
+        """(future, leader): the leader answers and calls finish(); the others wait on the future."""
+        with self.lock:
+            future = self._futures.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._futures[key] = Future()
+            self.leaders += 1
+            return future, True
+
+    def finish(self, key, future, result=None, error=None):
+        with self.lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def submit(self, key, executor, fn, *args):
+        """Future of fn(*args) run on executor, or of the identical call already running."""
+        future, leader = self.join(key)
+        if leader:
+            def run():
+                try:
+                    result = fn(*args)
+                except BaseException as e:
+                    self.finish(key, future, error=e)
+                else:
+                    self.finish(key, future, result)
+            executor.submit(run)
+        return future
+
+    def stats(self):
+        with self.lock:
+            return {"in_flight": len(self._futures), "leaders": self.leaders, "coalesced": self.coalesced}
+
+
+def from_env():
+    """QueryCache configured by QUERY_CACHE_SIZE (0 = off), QUERY_CACHE_TTL and QUERY_CACHE_DISTANCE."""
+    return QueryCache(
+        max_entries=int(os.getenv("QUERY_CACHE_SIZE", MAX_ENTRIES)),
+        ttl=float(os.getenv("QUERY_CACHE_TTL", TTL_SECONDS)),
+        max_distance=float(os.getenv("QUERY_CACHE_DISTANCE", MAX_DISTANCE)),
+    )
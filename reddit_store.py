@@ -0,0 +1,176 @@
+"""SQLite store for raw scraped Reddit rows.
+
+Rows are upserted on their Reddit `id`, and the per-subreddit watermark used by
+data_collection.py comes from an index on (subreddit, created_utc), so a run only
+touches the rows it adds. reddit_data.csv is kept as an export for the downstream
+scripts.
+"""
+import os
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+
+DB_PATH = "reddit_data.db"
+
+COLUMNS = [
+    "id", "category", "subreddit", "title", "content", "author",
+    "score", "num_comments", "created_utc", "edited", "type", "parent_id"
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rows (
+    id TEXT PRIMARY KEY,
+    category TEXT,
+    subreddit TEXT,
+    title TEXT,
+    content TEXT,
+    author TEXT,
+    score INTEGER,
+    num_comments INTEGER,
+    created_utc TEXT,
+    edited,
+    type TEXT,
+    parent_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_rows_subreddit_created ON rows (subreddit, created_utc);
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TEXT,
+    finished_at TEXT
+);
+CREATE TABLE IF NOT EXISTS run_progress (
+    run_id INTEGER,
+    subreddit TEXT,
+    rows_added INTEGER,
+    completed_at TEXT,
+    PRIMARY KEY (run_id, subreddit)
+);
+"""
+
+UPSERT_SQL = (
+    f"INSERT INTO rows ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)}) "
+    "ON CONFLICT(id) DO UPDATE SET "
+    + ", ".join(f"{c} = excluded.{c}" for c in COLUMNS if c != "id")
+)
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _now():
+    return datetime.now().strftime(TIME_FORMAT)
+
+
+def _to_sql_value(column, value):
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    if column == "created_utc":
+        return pd.Timestamp(value).strftime(TIME_FORMAT)
+    if hasattr(value, "item"):  # numpy scalars
+        return value.item()
+    return value
+
+
+class RedditStore:
+    """Embedded database holding every scraped post and comment."""
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    def is_empty(self):
+        return self.conn.execute("SELECT 1 FROM rows LIMIT 1").fetchone() is None
+
+    def upsert(self, rows):
+        """Insert new rows or overwrite existing ones with the same id."""
+        with self.conn:
+            return self._upsert(rows)
+
+    def _upsert(self, rows):
+        values = [tuple(_to_sql_value(c, row.get(c)) for c in COLUMNS) for row in rows]
+        self.conn.executemany(UPSERT_SQL, values)
+        return len(values)
+
+    # --------- RUN CHECKPOINTS ----------
+    def start_run(self):
+        with self.conn:
+            cur = self.conn.execute("INSERT INTO runs (started_at) VALUES (?)", (_now(),))
+        return cur.lastrowid
+
+    def finish_run(self, run_id):
+        with self.conn:
+            self.conn.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (_now(), run_id))
+
+    def latest_unfinished_run(self):
+        row = self.conn.execute(
+            "SELECT run_id FROM runs WHERE finished_at IS NULL ORDER BY run_id DESC LIMIT 1"
+        ).fetchone()
+        return row[0] if row else None
+
+    def completed_subreddits(self, run_id):
+        rows = self.conn.execute("SELECT subreddit FROM run_progress WHERE run_id = ?", (run_id,))
+        return {sub for (sub,) in rows}
+
+    def checkpoint(self, run_id, subreddit, rows):
+        """Commit a subreddit's rows and mark it done in one transaction.
+
+        The subreddit's watermark is MAX(created_utc) over its rows, so it moves
+        forward in the same commit.
+        """
+        with self.conn:
+            added = self._upsert(rows)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO run_progress (run_id, subreddit, rows_added, completed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (run_id, subreddit, added, _now()),
+            )
+        return added
+
+    def last_time(self, subreddit):
+        """Newest created_utc stored for a subreddit (index lookup), or None."""
+        value = self.conn.execute(
+            "SELECT MAX(created_utc) FROM rows WHERE subreddit = ?", (subreddit,)
+        ).fetchone()[0]
+        return datetime.strptime(value, TIME_FORMAT) if value else None
+
+    def last_times(self, subreddits):
+        """Watermarks for the given subreddits, skipping ones never scraped."""
+        times = {sub: self.last_time(sub) for sub in subreddits}
+        return {sub: t for sub, t in times.items() if t is not None}
+
+    def import_csv(self, csv_path, chunksize=50_000):
+        """One-time migration of an existing reddit_data.csv into the store."""
+        total = 0
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+            chunk = chunk.reindex(columns=COLUMNS).astype(object)
+            total += self.upsert(chunk.to_dict(orient="records"))
+        return total
+
+    def to_dataframe(self):
+        df = pd.read_sql_query(f"SELECT {', '.join(COLUMNS)} FROM rows", self.conn)
+        df["created_utc"] = pd.to_datetime(df["created_utc"])
+        return df
+
+    def export_csv(self, csv_path):
+        """Rewrite csv_path from the store (one row per id)."""
+        self.to_dataframe().to_csv(csv_path, index=False)
+
+
+def append_csv(rows, csv_path):
+    """Append freshly scraped rows to the CSV export without rereading it.
+
+    Downstream scripts drop duplicate ids keeping the last one, so an updated
+    row appended here replaces its older copy.
+    """
+    df = pd.DataFrame(rows).reindex(columns=COLUMNS)
+    if df.empty:
+        return 0
+    df.to_csv(csv_path, mode="a", index=False, header=not os.path.exists(csv_path))
+    return len(df)
@@ -0,0 +1,83 @@
+"""Hybrid retrieval shared by app.py and evaluate.py.
+
+The vector store (Pinecone or the local index) and the BM25 keyword index are
+searched with the same filter, and their rankings are fused with reciprocal
+rank fusion. When the question names a tool and the BM25 index alone finds k
+chunks mentioning it, the vector store is not searched and callers do not
+embed the question: run keyword_search first, then hybrid_search only when it
+is needed.
+
+Hits come with their stored vectors (Pinecone include_values, or the local
+index's rows), which context_packing.py uses instead of re-embedding. Keyword-only
+hits come without vectors and are packed in rank order.
+"""
+import numpy as np
+
+from bm25_index import doc_key, reciprocal_rank_fusion
+from keyword_matcher import tool_mentions
+from local_index import LocalVectorIndex
+
+RETRIEVE_K = 10
+
+
+def keyword_only(question, keyword_hits, k):
+    """True when the BM25 hits are k chunks that all mention a tool named in the question."""
+    tools = [kw for kws in tool_mentions(question).values() for kw in kws]
+    return bool(tools) and len(keyword_hits) >= k and all(
+        any(tool in doc.page_content.lower() for tool in tools) for doc, _ in keyword_hits
+    )
+
+
+class PineconeIndex:
+    """Pinecone index holding the chunks as store_index.py writes them (text under text_key)."""
+
+    def __init__(self, index, namespace=None, text_key="text"):
+        self.index = index
+        self.namespace = namespace
+        self.text_key = text_key
+
+    def similarity_search_with_vectors(self, embedding, k=4, filter=None):
+        """[(Document, score, stored vector)], like LocalVectorIndex."""
+        from langchain_core.documents import Document
+
+        response = self.index.query(vector=[float(x) for x in embedding], top_k=k, filter=filter,
+                                    include_values=True, include_metadata=True, namespace=self.namespace)
+        hits = []
+        for match in response.matches:
+            metadata = dict(match.metadata or {})
+            text = metadata.pop(self.text_key, "")
+            hits.append((Document(page_content=text, metadata=metadata, id=match.id), match.score,
+                         np.asarray(match.values, dtype=np.float32)))
+        return hits
+
+
+def dense_search(vector_store, query_vector, k=RETRIEVE_K, search_filter=None):
+    """[(doc, score, stored vector)] of the k nearest chunks with text."""
+    hits = vector_store.similarity_search_with_vectors(query_vector, k=k, filter=search_filter)
+    return [(doc, score, vector) for doc, score, vector in hits if doc.page_content.strip()]
+
+
+def keyword_search(question, keyword_index=None, k=RETRIEVE_K, search_filter=None):
+    """(BM25 hits, True when they are the whole result, see keyword_only)."""
+    keyword_hits = keyword_index.search(question, k=k, filter=search_filter) if keyword_index else []
+    return keyword_hits, keyword_only(question, keyword_hits, k)
+
+
+def hybrid_search(query_vector, vector_store, keyword_hits=(), k=RETRIEVE_K, search_filter=None):
+    """([(doc, score)] of the k best chunks, their stored vectors), fusing the dense hits with keyword_hits.
+
+    Scores are fused RRF scores when there are keyword hits. Chunks found by BM25
+    alone get their vectors from the local index; with Pinecone (which would need
+    another round trip) they get a zero vector, which context packing ranks last.
+    """
+    dense = dense_search(vector_store, query_vector, k, search_filter)
+    vectors = {doc_key(doc): vector for doc, _, vector in dense}
+    dense_hits = [(doc, score) for doc, score, _ in dense]
+    hits = reciprocal_rank_fusion([dense_hits, keyword_hits], k=k) if keyword_hits else dense_hits
+
+    missing = [doc for doc, _ in hits if doc_key(doc) not in vectors]
+    if missing and isinstance(vector_store, LocalVectorIndex):
+        vectors.update(zip(map(doc_key, missing), vector_store.vectors_for_ids([doc.id for doc in missing])))
+    zeros = np.zeros(len(query_vector), dtype=np.float32)
+    found = [vectors.get(doc_key(doc)) for doc, _ in hits]
+    return hits, [zeros if vector is None else vector for vector in found]
@@ -0,0 +1,122 @@
+"""On-disk cache of VADER compound scores keyed by a hash of clean_text.
+
+Most texts in reddit_data_clean.csv are unchanged between runs of
+data_sentiment.py, so only texts missing from the cache are scored. Entries carry
+the number of the last run that used them; when the cache grows past
+max_entries, the least recently used ones are evicted. The cache is cleared
+whenever the analyzer fingerprint (lexicon, VADER version, thresholds) changes.
+"""
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from sentiment_engine import score_texts
+
+CACHE_PATH = "sentiment_cache.db"
+MAX_ENTRIES = 2_000_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    key INTEGER PRIMARY KEY,
+    compound REAL,
+    last_used INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_scores_last_used ON scores (last_used);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def text_keys(texts):
+    """Stable 64-bit hash of each text, as signed ints SQLite can store."""
+    hashes = pd.util.hash_array(np.array([str(t) for t in texts], dtype=object))
+    return hashes.view(np.int64)
+
+
+class SentimentCache:
+    """Compound scores of previously scored texts."""
+
+    def __init__(self, fingerprint, path=CACHE_PATH, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+        self.conn.execute("CREATE TEMP TABLE wanted (key INTEGER PRIMARY KEY)")
+        self.invalidated = self._meta("fingerprint") not in (None, fingerprint)
+        with self.conn:
+            if self.invalidated:
+                self.conn.execute("DELETE FROM scores")
+            self._set_meta("fingerprint", fingerprint)
+            self.run = int(self._meta("run") or 0) + 1
+            self._set_meta("run", str(self.run))
+
+    def close(self):
+        self.conn.close()
+
+    def _meta(self, name):
+        row = self.conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, name, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+
+    def get_many(self, keys):
+        """{key: compound} for the cached keys, marking them used by this run."""
+        with self.conn:
+            self.conn.execute("DELETE FROM wanted")
+            self.conn.executemany("INSERT OR IGNORE INTO wanted (key) VALUES (?)",
+                                  ((int(k),) for k in keys))
+            found = dict(self.conn.execute(
+                "SELECT s.key, s.compound FROM scores s JOIN wanted w ON s.key = w.key"
+            ))
+            self.conn.execute(
+                "UPDATE scores SET last_used = ? WHERE key IN (SELECT key FROM wanted)", (self.run,)
+            )
+        return found
+
+    def put_many(self, keys, scores):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO scores (key, compound, last_used) VALUES (?, ?, ?)",
+                ((int(k), float(s), self.run) for k, s in zip(keys, scores)),
+            )
+
+    def evict(self):
+        """Drop the least recently used entries beyond max_entries; returns how many."""
+        excess = self.count() - self.max_entries
+        if excess <= 0:
+            return 0
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM scores WHERE key IN "
+                "(SELECT key FROM scores ORDER BY last_used LIMIT ?)", (excess,)
+            )
+        return excess
+
+
+def cached_scores(texts, cache, workers=None):
+    """Compound score of every text, scoring only texts the cache does not hold.
+
+    Returns (scores, hits) where hits is the number of texts served from the cache.
+    """
+    texts = [str(t) for t in texts]
+    keys = text_keys(texts)
+    found = cache.get_many(keys)
+
+    scores = np.array([found.get(int(k), np.nan) for k in keys], dtype=np.float64)
+    missing = np.isnan(scores)
+    # Repeated texts are scored once
+    miss_keys, first, inverse = np.unique(keys[missing], return_index=True, return_inverse=True)
+    miss_texts = [texts[i] for i in np.flatnonzero(missing)[first]]
+    new_scores = score_texts(miss_texts, workers=workers) if miss_texts else np.empty(0)
+    scores[missing] = new_scores[inverse]
+
+    cache.put_many(miss_keys, new_scores)
+    cache.evict()
+    return scores, int((~missing).sum())
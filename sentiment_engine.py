@@ -0,0 +1,70 @@
+"""Parallel VADER sentiment scoring.
+
+VADER is pure Python, so scoring one row at a time through Series.apply keeps a
+single core busy. score_texts splits the texts into chunks and scores them in a
+process pool where every worker loads its own SentimentIntensityAnalyzer once.
+Compound scores come back as one NumPy array, and label_scores turns them into
+positive/negative/neutral labels without a Python loop.
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import nltk
+import numpy as np
+from nltk.sentiment import SentimentIntensityAnalyzer
+
+POSITIVE_THRESHOLD = 0.05
+NEGATIVE_THRESHOLD = -0.05
+CHUNK_SIZE = 2_000
+
+_sia = None  # per-process analyzer, set by _init_worker
+
+
+def _init_worker():
+    global _sia
+    _sia = SentimentIntensityAnalyzer()
+
+
+def _score_chunk(texts):
+    return np.array([_sia.polarity_scores(text)["compound"] for text in texts], dtype=np.float64)
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def score_texts(texts, workers=None, chunk_size=CHUNK_SIZE):
+    """VADER compound score of every text, as a float64 array in input order.
+
+    Callers that run this from a script must do so under
+    `if __name__ == "__main__":`, since spawned workers re-import the main module.
+    """
+    texts = [str(text) for text in texts]
+    workers = workers or default_workers()
+    if workers == 1 or len(texts) <= chunk_size:
+        if _sia is None:
+            _init_worker()
+        return _score_chunk(texts)
+
+    chunks = [texts[start:start + chunk_size] for start in range(0, len(texts), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        return np.concatenate(list(pool.map(_score_chunk, chunks)))
+
+
+def analyzer_fingerprint(positive=POSITIVE_THRESHOLD, negative=NEGATIVE_THRESHOLD):
+    """Changes whenever the VADER lexicon, the NLTK version or the label thresholds change."""
+    lexicon = SentimentIntensityAnalyzer().lexicon_file
+    payload = json.dumps({
+        "lexicon": hashlib.sha256(lexicon.encode("utf-8")).hexdigest(),
+        "nltk": nltk.__version__,
+        "thresholds": [positive, negative],
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def label_scores(scores, positive=POSITIVE_THRESHOLD, negative=NEGATIVE_THRESHOLD):
+    """Same labels as the old get_sentiment: > positive, < negative, else neutral."""
+    scores = np.asarray(scores)
+    return np.select([scores > positive, scores < negative], ["positive", "negative"], "neutral")
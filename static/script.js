@@ -12,6 +12,21 @@ const createMessageElement = (content, ...classes) => {
   return div;
 };
 
+// Helper: parse one Server-Sent Events message ("event: name\ndata:<json>")
+const parseEvent = (raw) => {
+  let name = "message";
+  let data = "";
+  for (const line of raw.split("\n")) {
+    if (line.startsWith("event:")) name = line.slice(6).trim();
+    else if (line.startsWith("data:")) data += line.slice(5);
+  }
+  try {
+    return { name, data: JSON.parse(data) };
+  } catch (err) {
+    return { name, data };
+  }
+};
+
 // Handle message sending
 const handleOutgoingMessage = async (e) => {
   e.preventDefault();
@@ -39,21 +54,47 @@ const handleOutgoingMessage = async (e) => {
   chatBody.appendChild(botDiv);
   chatBody.scrollTo({ top: chatBody.scrollHeight, behavior: "smooth" });
 
-  // Fetch chatbot response
+  // Stream chatbot response: tokens are rendered as they arrive
+  const messageText = botDiv.querySelector(".message-text");
+  let answer = "";
+  const render = (text) => {
+    botDiv.classList.remove("thinking");
+    messageText.innerText = text;
+    chatBody.scrollTo({ top: chatBody.scrollHeight });
+  };
+
   try {
-    const response = await fetch("/get", {
+    const response = await fetch("/get/stream", {
       method: "POST",
       body: new URLSearchParams({ msg: userMessage }),
       headers: { "Content-Type": "application/x-www-form-urlencoded" },
     });
-    const data = await response.text();
-
-    botDiv.classList.remove("thinking");
-    botDiv.querySelector(".message-text").innerText = data;
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = "";
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += value;
+      const events = buffer.split("\n\n");
+      buffer = events.pop(); // incomplete event, completed by the next read
+      for (const raw of events) {
+        const event = parseEvent(raw);
+        if (event.name === "token") {
+          answer += event.data;
+          render(answer);
+        } else if (event.name === "replace" || event.name === "error") {
+          answer = event.data;
+          render(answer);
+        } else if (event.name === "sources") {
+          botDiv.dataset.sources = JSON.stringify(event.data);
+        } else if (event.name === "done") {
+          console.log(`time to first token: ${event.data.ttft_ms} ms, answer: ${event.data.total_ms} ms`);
+        }
+      }
+    }
+    if (!answer) render("⚠️ Error: Empty response from the server.");
   } catch (err) {
-    botDiv.classList.remove("thinking");
-    botDiv.querySelector(".message-text").innerText =
-      "⚠️ Error: Unable to reach the server.";
+    render(answer || "⚠️ Error: Unable to reach the server.");
   }
 
   chatBody.scrollTo({ top: chatBody.scrollHeight, behavior: "smooth" });
@@ -1,32 +1,93 @@
 import os
 import sys
-import ast
+import argparse
+import hashlib
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 import pandas as pd
 from dotenv import load_dotenv
-from pinecone import Pinecone, ServerlessSpec
-from langchain_pinecone import PineconeVectorStore
-from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 
+from bm25_index import BM25_INDEX_DIR, BM25Builder
+from embedding_engine import BATCH_SIZE, get_embeddings
+from local_index import LOCAL_INDEX_DIR, LocalVectorIndex, vector_backend
+from query_cache import bump_index_version
+
 
 #  Ensure live logging (so Flask UI shows logs progressively)
 sys.stdout.reconfigure(line_buffering=True)
 
 
+INDEX_MANIFEST_PATH = "index_manifest.json"
+DELETE_BATCH = 1000      # Pinecone accepts up to 1000 ids per delete call
+READ_CHUNK_ROWS = 5000   # CSV rows read and split at a time
+EMBED_BATCH = 512        # chunks per embedding call (at least a few model batches per worker)
+UPSERT_BATCH = 100       # vectors per Pinecone upsert request
+QUEUE_SIZE = 4           # batches waiting between two stages
+PROGRESS_SECONDS = 5     # at most one progress line per interval
+
+parser = argparse.ArgumentParser(
+    description="Embed reddit_data_sentiment.csv into the Pinecone index (or the local index with VECTOR_BACKEND=local)."
+)
+parser.add_argument("--full", action="store_true",
+                    help="clear the index and re-embed every chunk instead of only new or changed ones")
+parser.add_argument("--batch-size", type=int, default=None, help=f"texts per model batch (default {BATCH_SIZE})")
+parser.add_argument("--workers", type=int, default=None, help="embedding processes (default 1)")
+parser.add_argument("--quantize", action="store_true", default=None,
+                    help="embed with the int8 dynamic-quantized model (re-embeds everything once)")
+parser.add_argument("--no-embed-cache", dest="embed_cache", action="store_false", default=None,
+                    help="do not read or fill the shared embedding cache")
+args = parser.parse_args()
+
+
+def chunk_id(source_id, position, chunk):
+    """Deterministic vector id: source row id, chunk position and a hash of the chunk.
+
+    The hash covers the metadata too, so a row whose sentiment or keywords change
+    is re-upserted even when its text did not.
+    """
+    payload = json.dumps([chunk.page_content, chunk.metadata], sort_keys=True, default=str)
+    return f"{source_id}:{position}:{hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]}"
+
+
+def load_manifest():
+    if not os.path.exists(INDEX_MANIFEST_PATH):
+        return None
+    with open(INDEX_MANIFEST_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(ids):
+    # Written to a temporary file first, so a crash mid-write keeps the last checkpoint
+    tmp = INDEX_MANIFEST_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"index_name": index_name, "embedding_model": embeddings.model_id, "ids": sorted(ids)}, f)
+    os.replace(tmp, INDEX_MANIFEST_PATH)
+
+
 #  Load environment variables
 print(" Loading environment variables...")
 load_dotenv()
-PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-if not PINECONE_API_KEY:
-    print(" Missing Pinecone API key in .env file.")
-    sys.exit(1)
+backend = vector_backend()
+if backend == "local":
+    index_name = LOCAL_INDEX_DIR
+else:
+    PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
+    if not PINECONE_API_KEY:
+        print(" Missing Pinecone API key in .env file.")
+        sys.exit(1)
 
+    #  Connect to Pinecone (imported here, so the local backend runs without it)
+    from pinecone import Pinecone, ServerlessSpec
 
-#  Connect to Pinecone
-print(" Connecting to Pinecone...")
-pc = Pinecone(api_key=PINECONE_API_KEY)
-index_name = "reddit-insights"
+    print(" Connecting to Pinecone...")
+    pc = Pinecone(api_key=PINECONE_API_KEY)
+    index_name = "reddit-insights"
 
 
 #  Load dataset
@@ -35,74 +96,260 @@ if not os.path.exists(DATA_PATH):
     print(f" File not found: {DATA_PATH}")
     sys.exit(1)
 
-df = pd.read_csv(DATA_PATH)
-print(f" Loaded dataset with {len(df)} rows.")
+
+#  Embedding engine (the model itself is only loaded once there is something to embed)
+embeddings = get_embeddings(batch_size=args.batch_size, workers=args.workers, quantize=args.quantize,
+                            cache=args.embed_cache)
 
 
-#  Convert rows to LangChain Documents
-print(" Preparing documents...")
+if backend == "local":
+    vectorstore = LocalVectorIndex(embeddings)
+    created = len(vectorstore) == 0
+    print(f" Using local vector index in {LOCAL_INDEX_DIR}/ ({len(vectorstore)} vectors).")
+else:
+    #  Create Pinecone Index if not exists
+    existing_indexes = [i["name"] for i in pc.list_indexes()]
+    created = index_name not in existing_indexes
+    if created:
+        print(f" Creating new Pinecone index: {index_name} ...")
+        pc.create_index(
+            name=index_name,
+            dimension=768,  # MiniLM vector dimension
+            metric="cosine",
+            spec=ServerlessSpec(cloud="aws", region="us-east-1"),
+        )
+        print(" Index created successfully!")
+    else:
+        print(f" Index '{index_name}' already exists. Using existing index.")
+    index = pc.Index(index_name)
+
 
-docs = []
-for _, row in df.iterrows():
-    text = str(row.get("clean_text", "")).strip()
-    if not text or text.lower() == "nan":
-        continue
+def delete_vectors(ids=None, delete_all=False):
+    if backend == "local":
+        vectorstore.delete(ids=ids, delete_all=delete_all)
+    elif delete_all:
+        # A serverless index without vectors has no namespace yet, and deleting from it is a 404
+        from pinecone.exceptions import NotFoundException
 
-    # Safe keyword parsing
-    keywords = []
-    if isinstance(row.get("keywords_found"), str):
+        if not index.describe_index_stats().total_vector_count:
+            return
         try:
-            keywords = ast.literal_eval(row["keywords_found"])
-        except (ValueError, SyntaxError):
-            keywords = [row["keywords_found"]]
+            index.delete(delete_all=True)
+        except NotFoundException:
+            pass
+    else:
+        index.delete(ids=ids)
 
-    metadata = {
-        "id": row.get("id", ""),
-        "category": row.get("category", ""),
-        "subreddit": row.get("subreddit", ""),
-        "keywords": ", ".join(keywords) if keywords else "",
-        "sentiment": row.get("sentiment", ""),
-    }
 
-    docs.append(Document(page_content=text, metadata=metadata))
+def upsert_vectors(ids, chunks, vectors):
+    """Store precomputed vectors; page_content goes under "text" like PineconeVectorStore does."""
+    if backend == "local":
+        vectorstore.add_vectors(vectors, [c.page_content for c in chunks], [c.metadata for c in chunks], ids)
+        return
+    for start in range(0, len(ids), UPSERT_BATCH):
+        index.upsert(vectors=[
+            {"id": i, "values": list(v), "metadata": {**c.metadata, "text": c.page_content}}
+            for i, c, v in zip(ids[start:start + UPSERT_BATCH], chunks[start:start + UPSERT_BATCH],
+                               vectors[start:start + UPSERT_BATCH])
+        ])
 
-print(f" Prepared {len(docs)} documents.")
+
+#  Work out what changed since the last run. Without a usable manifest the
+#  index may hold vectors with random ids from older runs, so it is rebuilt.
+manifest = None if args.full else load_manifest()
+incremental = (
+    not created
+    and manifest is not None
+    and manifest.get("index_name") == index_name
+    and manifest.get("embedding_model") == embeddings.model_id
+)
+if incremental:
+    indexed = set(manifest["ids"])
+    print(f" Incremental index: {len(indexed)} chunks already indexed.")
+else:
+    reason = "--full" if args.full else "new index" if created else "no manifest" if manifest is None else "settings changed"
+    print(f" Full re-index ({reason}).")
+    if not created:
+        delete_vectors(delete_all=True)
+    indexed = set()
+    if backend != "local":
+        save_manifest(indexed)  # the old manifest no longer matches the cleared index
 
 
-#  Split into Chunks
-print(" Splitting documents into smaller chunks...")
+#  Pipeline: read + split (thread) -> embed (main thread) -> upload (thread).
+#  Bounded queues keep only a few batches in memory at a time, and the upload
+#  of one batch overlaps the embedding of the next.
 splitter = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=80)
-doc_chunks = splitter.split_documents(docs)
-print(f" After splitting: {len(doc_chunks)} total chunks ready for embedding.")
-
-
-#  Embeddings Setup
-print(" Initializing embedding model (MiniLM)...")
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
-
-
-#  Create Pinecone Index if not exists
-existing_indexes = [i["name"] for i in pc.list_indexes()]
-if index_name not in existing_indexes:
-    print(f" Creating new Pinecone index: {index_name} ...")
-    pc.create_index(
-        name=index_name,
-        dimension=768,  # MiniLM vector dimension
-        metric="cosine",
-        spec=ServerlessSpec(cloud="aws", region="us-east-1"),
-    )
-    print(" Index created successfully!")
+stages = {name: {"items": 0, "seconds": 0.0} for name in ["read", "split", "embed", "upload"]}
+seen_ids = set()  # every chunk id in the CSV, for the manifest and stale deletes
+stored_ids = set(indexed)  # chunk ids in the index so far, for the manifest checkpoints
+keyword_index = BM25Builder()  # rebuilt from every chunk, new or not
+
+
+def timed(stage, items, started):
+    stages[stage]["items"] += items
+    stages[stage]["seconds"] += time.perf_counter() - started
+
+
+def rate(stage):
+    stats = stages[stage]
+    return stats["items"] / stats["seconds"] if stats["seconds"] else 0.0
+
+
+def prepare_rows(frame):
+    """(texts, metadatas) of the rows worth indexing, built column-wise."""
+    frame = frame.fillna("")
+    texts = frame["clean_text"].str.strip()
+    keep = (texts != "") & (texts.str.lower() != "nan")
+    frame, texts = frame[keep], texts[keep]
+    # "['a', 'b']" -> "a, b", what ", ".join(ast.literal_eval(...)) gave
+    keywords = frame["keywords_found"].str.strip("[]").str.replace("'", "").str.replace('"', "")
+    metadatas = pd.DataFrame({
+        "id": frame["id"],
+        "category": frame["category"],
+        "subreddit": frame["subreddit"],
+        "keywords": keywords,
+        "sentiment": frame["sentiment"],
+    }).to_dict("records")
+    return texts.tolist(), metadatas
+
+
+def new_chunk_batches():
+    """Read the CSV in chunks and yield (ids, chunks) of chunks missing from the index."""
+    columns = ["id", "clean_text", "keywords_found", "category", "subreddit", "sentiment"]
+    reader = pd.read_csv(DATA_PATH, chunksize=READ_CHUNK_ROWS, dtype=str,
+                         usecols=lambda c: c in columns)
+    while True:
+        started = time.perf_counter()
+        frame = next(reader, None)
+        if frame is None:
+            return
+        for column in columns:
+            if column not in frame:
+                frame[column] = ""
+        texts, metadatas = prepare_rows(frame)
+        timed("read", len(frame), started)
+
+        started = time.perf_counter()
+        ids, chunks, total = [], [], 0
+        for text, metadata in zip(texts, metadatas):
+            # Split per document, so every chunk knows its position
+            for position, piece in enumerate(splitter.split_text(text)):
+                chunk = Document(page_content=piece, metadata={**metadata, "chunk": position})
+                key = chunk_id(metadata["id"], position, chunk)
+                seen_ids.add(key)
+                keyword_index.add(key, piece, chunk.metadata)
+                total += 1
+                if key not in indexed:
+                    ids.append(key)
+                    chunks.append(chunk)
+        timed("split", total, started)
+        if ids:
+            yield ids, chunks
+
+
+def in_background(batches, maxsize=QUEUE_SIZE):
+    """Run a generator on its own thread, handing its items over through a bounded queue."""
+    handoff = queue.Queue(maxsize)
+    done = object()
+
+    def produce():
+        try:
+            for item in batches:
+                handoff.put((item, None))
+        except BaseException as e:
+            handoff.put((None, e))
+        handoff.put((done, None))
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        item, error = handoff.get()
+        if error is not None:
+            raise error
+        if item is done:
+            return
+        yield item
+
+
+def embed_batches(batches):
+    """Regroup the new chunks into EMBED_BATCH-sized batches."""
+    size = max(EMBED_BATCH, embeddings.batch_size * 4 * embeddings.workers)
+    pending_ids, pending_chunks = [], []
+    for ids, chunks in batches:
+        pending_ids += ids
+        pending_chunks += chunks
+        while len(pending_ids) >= size:
+            yield pending_ids[:size], pending_chunks[:size]
+            pending_ids, pending_chunks = pending_ids[size:], pending_chunks[size:]
+    if pending_ids:
+        yield pending_ids, pending_chunks
+
+
+def upload(ids, chunks, vectors):
+    started = time.perf_counter()
+    upsert_vectors(ids, chunks, vectors)
+    timed("upload", len(ids), started)
+    stored_ids.update(ids)
+    if backend != "local":
+        # Checkpoint, so a crashed run resumes incrementally. The local index
+        # only keeps new vectors once persist() runs at the end.
+        save_manifest(stored_ids)
+
+
+print(f" Streaming {DATA_PATH} in chunks of {READ_CHUNK_ROWS} rows "
+      f"(embedding with {embeddings.model_id}, batch size {embeddings.batch_size}, {embeddings.workers} workers)...")
+added = 0
+last_report = time.perf_counter()
+uploads = deque()
+with ThreadPoolExecutor(max_workers=1) as uploader:
+    for ids, chunks in embed_batches(in_background(new_chunk_batches())):
+        started = time.perf_counter()
+        vectors = embeddings.embed_documents([c.page_content for c in chunks])
+        timed("embed", len(ids), started)
+
+        uploads.append(uploader.submit(upload, ids, chunks, vectors))
+        while len(uploads) > QUEUE_SIZE:
+            uploads.popleft().result()  # wait here when uploads fall behind
+        added += len(ids)
+        if time.perf_counter() - last_report < PROGRESS_SECONDS:
+            continue
+        last_report = time.perf_counter()
+        print(f" Embedded {added} new chunks ({rate('embed'):,.0f} chunks/s), "
+              f"uploaded {stages['upload']['items']} ({rate('upload'):,.0f} chunks/s).")
+    while uploads:
+        uploads.popleft().result()
+if hasattr(embeddings, "close"):
+    embeddings.close()
+
+print(f" Read {stages['read']['items']} rows ({rate('read'):,.0f} rows/s), "
+      f"split into {stages['split']['items']} chunks ({rate('split'):,.0f} chunks/s).")
+if added:
+    print(f" Uploaded {added} embeddings to {index_name}: embed {rate('embed'):,.0f} chunks/s, "
+          f"upload {rate('upload'):,.0f} chunks/s.")
+    if hasattr(embeddings, "cache"):
+        stats = embeddings.cache.stats()
+        print(f" Embedding cache: {stats['hits']} of {stats['hits'] + stats['misses']} chunks "
+              f"were cached ({stats['hit_rate']:.1%}), {stats['entries']} entries.")
 else:
-    print(f" Index '{index_name}' already exists. Using existing index.")
+    print(" Nothing new to embed.")
 
 
-#  Upload to Pinecone
-print(" Uploading embeddings to Pinecone...")
-vectorstore = PineconeVectorStore.from_documents(
-    documents=doc_chunks,
-    index_name=index_name,
-    embedding=embeddings,
-)
+keyword_index.save()
+print(f" Saved BM25 keyword index of {keyword_index.n_docs} chunks to {BM25_INDEX_DIR}/.")
+
+
+#  Remove vectors of deleted or changed rows
+to_delete = sorted(indexed - seen_ids)
+for start in range(0, len(to_delete), DELETE_BATCH):
+    delete_vectors(ids=to_delete[start:start + DELETE_BATCH])
+if to_delete:
+    print(f" Deleted {len(to_delete)} stale vectors.")
+
+if added or to_delete or not incremental:
+    if backend == "local":
+        print(" Rebuilding local IVF lists...")
+        vectorstore.persist()
+    bump_index_version()  # the app drops its cached answers
 
-print(" Uploaded all embeddings to Pinecone successfully.")
+save_manifest(seen_ids)
 print(" Indexing complete and ready for chatbot use.")
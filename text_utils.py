@@ -0,0 +1,74 @@
+"""Column-level text normalization shared by the cleaning and sentiment steps."""
+import ast
+import re
+
+import pandas as pd
+
+URL_PATTERN = re.compile(r"http\S+|www\S+")
+NON_ALPHA_PATTERN = re.compile(r"[^a-z\s]")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+BATCH_SIZE = 100_000
+
+
+def clean_text(text):
+    """Clean a single text for embeddings (reference for clean_texts)."""
+    text = str(text).lower()
+    text = URL_PATTERN.sub("", text)
+    text = NON_ALPHA_PATTERN.sub("", text)
+    text = WHITESPACE_PATTERN.sub(" ", text).strip()
+    return text
+
+
+def clean_texts(texts, batch_size=BATCH_SIZE):
+    """Same output as clean_text for every item, computed a batch at a time.
+
+    Each batch is joined into one string so every regex runs once per batch in C
+    instead of once per row in Python. Newlines inside a text are turned into
+    spaces first; clean_text collapses them to a space anyway. str.split() uses
+    the same whitespace definition as \\s, so it does the final collapse and strip.
+    """
+    texts = [str(t).replace("\n", " ") for t in texts]
+    cleaned = []
+    for start in range(0, len(texts), batch_size):
+        blob = "\n".join(texts[start:start + batch_size]).lower()
+        blob = URL_PATTERN.sub("", blob)
+        blob = NON_ALPHA_PATTERN.sub("", blob)
+        cleaned.extend(" ".join(text.split()) for text in blob.split("\n"))
+    return cleaned
+
+
+def clean_text_series(series):
+    return pd.Series(clean_texts(series.tolist()), index=series.index, dtype=object)
+
+
+def build_full_text(title, content):
+    """Join title and content with a space, leaving out whichever is missing.
+
+    Replaces `astype(str).agg(" ".join, axis=1)`, which turned a missing title
+    into a literal "nan" token.
+    """
+    both = title.notna() & content.notna()
+    joined = title.where(both, "").astype(str) + " " + content.where(both, "").astype(str)
+    single = title.astype(object).fillna(content).fillna("").astype(str)
+    return joined.where(both, single)
+
+
+def strip_nan_words(series):
+    """Vectorized clean_nan_words: drop literal "nan" tokens left by older runs."""
+    return (
+        series.astype(str).str.lower()
+        .str.replace("nan ", "", regex=False)
+        .str.replace(" nan", "", regex=False)
+        .str.strip()
+    )
+
+
+def parse_list(value):
+    """Lists come back from the CSV as their repr, e.g. "['clio']"."""
+    if isinstance(value, list):
+        return value
+    try:
+        return ast.literal_eval(value) if isinstance(value, str) else []
+    except (ValueError, SyntaxError):
+        return [value]